@@ -1,11 +1,19 @@
-from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 from app.core import config
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
 from app.tools.weather_tools import get_weather_data
 from app.tools.time_tools import get_current_time, calculate_date_relative, convert_time_zones
-from app.tools.math_tools import scientific_calculator, calculate_statistics
+from app.tools.time_tools import get_current_time_batch, calculate_date_relative_batch, convert_time_zones_batch
+from app.tools.math_tools import scientific_calculator, evaluate_expression, calculate_statistics
 from app.tools.knowledge_base import query_knowledge_base
+from app.agents.llm_registry import LLMRegistry
+from app.core.context_window import estimate_tokens
+from collections import deque
+from functools import lru_cache
+from threading import Lock
+import statistics
+import time
+import re
 
 load_dotenv()
 
@@ -15,34 +23,185 @@ TOOLS = [
     get_current_time,
     calculate_date_relative,
     convert_time_zones,
+    get_current_time_batch,
+    calculate_date_relative_batch,
+    convert_time_zones_batch,
     scientific_calculator,
+    evaluate_expression,
     calculate_statistics,
     query_knowledge_base
 ]
 
 
 
+@lru_cache(maxsize=None)
+def _keyword_pattern(keywords: tuple[str, ...]) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")\b", re.IGNORECASE)
+
+
+def select_tools(prompt: str, has_documents: bool) -> list:
+    """The tools bound for one request: document tools only for chats with documents, optionally keyword-routed."""
+    tools = [tool for tool in TOOLS if has_documents or tool.name not in config.DOCUMENT_TOOLS]
+    if config.TOOL_ROUTING_ENABLED:
+        keywords = config.TOOL_ROUTING_KEYWORDS
+        routed = [tool for tool in tools 
+                  if tool.name not in keywords or _keyword_pattern(tuple(keywords[tool.name])).search(prompt)]
+        # no keyword hit: the model still gets every tool rather than none
+        if any(tool.name in keywords for tool in routed):
+            tools = routed
+    return tools
+
+
+
+def route_model(prompt: str, stage: str = "initial", assistant_type: str = config.DEFAULT_ASSISTANT_TYPE) -> tuple[str, str]:
+    """
+    (model, route) of a turn: the first of config.MODEL_ROUTING_RULES matching the tool-loop stage
+    ("initial" or "tool_followup"), the assistant type and the prompt's size and keywords.
+    """
+    if not config.MODEL_ROUTING_ENABLED:
+        return config.MODEL_ROUTING_DEFAULT, "default"
+    
+    prompt_tokens = estimate_tokens(prompt)
+    for rule in config.MODEL_ROUTING_RULES:
+        if "stage" in rule and rule["stage"] != stage:
+            continue
+        if "assistant_type" in rule and rule["assistant_type"] != assistant_type:
+            continue
+        if "min_prompt_tokens" in rule and prompt_tokens < rule["min_prompt_tokens"]:
+            continue
+        if "max_prompt_tokens" in rule and prompt_tokens > rule["max_prompt_tokens"]:
+            continue
+        if "keywords" in rule and not _keyword_pattern(tuple(rule["keywords"])).search(prompt):
+            continue
+        return rule["model"], rule["route"]
+    return config.MODEL_ROUTING_DEFAULT, "default"
+
+
+
+class RouteStats:
+    """Per (route, model) latencies of the routed model calls: time to first chunk and total."""
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(RouteStats, cls).__new__(cls)
+                    cls._instance._routes = dict()
+                    cls._instance._record_lock = Lock()
+
+        return cls._instance
+    
+    
+    def record(self, route: str, model_name: str, first_chunk_seconds: float | None, total_seconds: float, outcome: str = "ok"):
+        with self._record_lock:
+            entry = self._routes.setdefault((route, model_name), {
+                "calls": 0, "errors": 0, "fallbacks": 0, "escalations": 0,
+                "first_chunk_ms": deque(maxlen=config.MODEL_ROUTING_LATENCY_WINDOW),
+                "total_ms": deque(maxlen=config.MODEL_ROUTING_LATENCY_WINDOW)
+            })
+            entry["calls"] += 1
+            if outcome == "error":
+                entry["errors"] += 1
+            elif outcome in ("fallback", "escalation"):
+                entry[f"{outcome}s"] += 1
+            if first_chunk_seconds is not None:
+                entry["first_chunk_ms"].append(first_chunk_seconds * 1000)
+            entry["total_ms"].append(total_seconds * 1000)
+        
+        if config.MODEL_ROUTING_LOG:
+            first_chunk_ms = f"{first_chunk_seconds * 1000:.0f}" if first_chunk_seconds is not None else "-"
+            print(f"--> route={route} model={model_name} outcome={outcome} "
+                  f"first_chunk_ms={first_chunk_ms} total_ms={total_seconds * 1000:.0f}")
+    
+    
+    @staticmethod
+    def _percentiles(values) -> dict:
+        if not values:
+            return {"p50": 0.0, "p95": 0.0}
+        ordered = sorted(values)
+        return {"p50": round(statistics.median(ordered), 1), 
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1)}
+    
+    
+    def stats(self) -> dict:
+        with self._record_lock:
+            routes = {f"{route}:{model_name}": dict(entry) for (route, model_name), entry in self._routes.items()}
+        for entry in routes.values():
+            entry["first_chunk_ms"] = self._percentiles(entry["first_chunk_ms"])
+            entry["total_ms"] = self._percentiles(entry["total_ms"])
+        return {"enabled": config.MODEL_ROUTING_ENABLED, "routes": routes}
+
+
+
 # factory function
 def get_model(model_name: str | None = None, temperature: float | None = None):
-    """Factory function to get a configured LLM."""
-    return ChatGroq(
-        model=model_name or config.DEFAULT_MODEL,
-        temperature=temperature or config.DEFAULT_TEMPERATURE
-    )
+    """Factory function to get a configured LLM (cached process-wide)."""
+    return LLMRegistry().get_model(model_name=model_name, temperature=temperature)
+
+
+def warm_up():
+    """Pre-builds the bound chat runnables, so the first turn skips client setup."""
+    # the two common tool sets (chats with and without documents) on every routed model
+    models = {config.MODEL_ROUTING_DEFAULT, *(rule["model"] for rule in config.MODEL_ROUTING_RULES)}
+    for model_name in sorted(models):
+        LLMRegistry().warm_up(tools=TOOLS, model_name=model_name)
+        LLMRegistry().warm_up(tools=select_tools("", has_documents=False), model_name=model_name)
+
+
+async def _routed_stream(full_message: list, tools: list, model_name: str, route: str, assistant_type: str):
+    """Streams from the routed model, retrying on the fallback/escalation model while nothing was streamed."""
+    tried = set()
+    while True:
+        tried.add(model_name)
+        runnable = LLMRegistry().get_runnable(tools=tools, model_name=model_name, assistant_type=assistant_type)
+        started = time.perf_counter()
+        first_chunk_seconds = None
+        streamed = False
+        try:
+            async for chunk in runnable.astream(full_message):
+                if first_chunk_seconds is None:
+                    first_chunk_seconds = time.perf_counter() - started
+                streamed = streamed or bool(chunk.content or chunk.tool_calls)
+                yield chunk
+        except Exception as e:
+            fallback = config.MODEL_FALLBACKS.get(model_name)
+            if streamed or fallback is None or fallback in tried:
+                RouteStats().record(route, model_name, first_chunk_seconds, time.perf_counter() - started, outcome="error")
+                raise
+            print(f"!!! Model {model_name} failed on route '{route}', falling back to {fallback}: {str(e)}")
+            RouteStats().record(route, model_name, first_chunk_seconds, time.perf_counter() - started, outcome="fallback")
+            model_name = fallback
+            continue
+        
+        escalation = config.MODEL_ESCALATIONS.get(model_name)
+        if not streamed and escalation is not None and escalation not in tried:
+            RouteStats().record(route, model_name, first_chunk_seconds, time.perf_counter() - started, outcome="escalation")
+            model_name = escalation
+            continue
+        RouteStats().record(route, model_name, first_chunk_seconds, time.perf_counter() - started)
+        return
 
 
 # streaming version
-def get_stream(messages, assitant_type: str = config.DEFAULT_ASSISTANT_TYPE, extra_context: str | None = None):
-    """ Main Model for Answering User Queries."""
-    llm = get_model(model_name=config.NEW_OPENAI_MODEL)
-    agent_executor = llm.bind_tools(tools=TOOLS)
+def get_stream(messages, assitant_type: str = config.DEFAULT_ASSISTANT_TYPE, extra_context: str | None = None,
+               summary: str | None = None, tools: list | None = None, 
+               model_name: str | None = None, route: str | None = None):
+    """ Main Model for Answering User Queries. Returns an async iterator of message chunks."""
+    tools = TOOLS if tools is None else tools
+    if model_name is None:
+        prompt = next((message.content for message in reversed(messages) if isinstance(message, HumanMessage)), "")
+        model_name, route = route_model(prompt if isinstance(prompt, str) else "", assistant_type=assitant_type)
     system_prompt = config.ALL_SYSTEM_PROMPTS.get(assitant_type, config.ALL_SYSTEM_PROMPTS[config.DEFAULT_ASSISTANT_TYPE])
 
+    if summary:
+        system_prompt += f"\n\nSummary of the earlier conversation:\n{summary}"
     if extra_context:
         system_prompt += f"\n\nRelevant Context for your analysis:\n{extra_context} \n\nInstruction: Use ONLY the provided context to answer if relevant."
     
     full_message = [SystemMessage(content=system_prompt)] + messages
-    return agent_executor.stream(full_message)
+    return _routed_stream(full_message, tools, model_name, route or "manual", assitant_type)
 
 
 
@@ -55,4 +214,27 @@ def generate_chat_title(user_query: str, ai_response: str) -> str:
     if isinstance(res.content, str):
         return res.content.strip().replace('"', '')
     else:
-        return user_query[:60]
\ No newline at end of file
+        return user_query[:60]
+
+
+
+async def summarize_conversation(previous_summary: str | None, messages: list) -> str:
+    """Folds older turns into the rolling conversation summary, using the small model."""
+    llm = get_model(model_name=config.SUMMARY_MODEL, temperature=0)
+    transcript = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        if isinstance(message, HumanMessage):
+            transcript.append(f"User: {content}")
+        elif isinstance(message, ToolMessage):
+            transcript.append(f"Tool ({message.name}): {content[:config.TOOL_RESULT_MAX_TOKENS * config.CHARS_PER_TOKEN]}")
+        elif content:
+            transcript.append(f"Assistant: {content}")
+    
+    prompt = (f"Update the summary of a conversation with its newer turns. Keep the facts, numbers, decisions "
+              f"and open questions the assistant may need later, in at most {config.SUMMARY_MAX_TOKENS} tokens. "
+              f"Only output the summary.\n\nCurrent summary: {previous_summary or 'None'}\n\nNewer turns:\n" + "\n".join(transcript))
+    res = await llm.ainvoke(prompt)
+    if isinstance(res.content, str) and res.content.strip():
+        return res.content.strip()
+    return previous_summary or ""
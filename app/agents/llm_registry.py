@@ -0,0 +1,113 @@
+from langchain_groq import ChatGroq
+from app.core import config
+from threading import Lock, RLock
+import httpx
+
+
+
+class LLMRegistry:
+    """
+    Process-wide cache of configured ChatGroq clients and their tool-bound runnables.
+    Every client shares one pair of keep-alive HTTP pools, so a turn never pays for
+    a new client, a new TLS handshake or re-serializing the tool schemas.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(LLMRegistry, cls).__new__(cls)
+                    cls._instance._runnables = dict()
+                    cls._instance._build_lock = RLock()
+                    cls._instance._http_client = None
+                    cls._instance._http_async_client = None
+                    cls._instance.hits = 0
+                    cls._instance.misses = 0
+
+        return cls._instance
+
+
+    def _get_http_clients(self) -> tuple[httpx.Client, httpx.AsyncClient]:
+        if self._http_client is None:
+            limits = httpx.Limits(max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+                                  max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE,
+                                  keepalive_expiry=config.LLM_HTTP_KEEPALIVE_EXPIRY)
+            timeout = httpx.Timeout(config.LLM_HTTP_TIMEOUT)
+            self._http_client = httpx.Client(limits=limits, timeout=timeout)
+            self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return self._http_client, self._http_async_client
+    
+    
+    def _get_or_build(self, key: tuple, builder):
+        runnable = self._runnables.get(key)
+        if runnable is not None:
+            self.hits += 1
+            return runnable
+        
+        with self._build_lock:
+            runnable = self._runnables.get(key)
+            if runnable is None:
+                self.misses += 1
+                runnable = builder()
+                self._runnables[key] = runnable
+            else:
+                self.hits += 1
+        return runnable
+    
+    
+    def get_model(self, model_name: str | None = None, temperature: float | None = None) -> ChatGroq:
+        """Returns a cached plain (tool-less) client."""
+        model_name = model_name or config.DEFAULT_MODEL
+        temperature = config.DEFAULT_TEMPERATURE if temperature is None else temperature
+
+        def build():
+            http_client, http_async_client = self._get_http_clients()
+            return ChatGroq(model=model_name,
+                            temperature=temperature,
+                            http_client=http_client,
+                            http_async_client=http_async_client)
+        
+        return self._get_or_build((model_name, temperature, (), None), build)
+    
+    
+    def get_runnable(self, tools: list, model_name: str | None = None, temperature: float | None = None,
+                     assistant_type: str = config.DEFAULT_ASSISTANT_TYPE):
+        """Returns a cached client with `tools` bound, keyed by (model, temperature, tool set, assistant type)."""
+        model_name = model_name or config.DEFAULT_MODEL
+        temperature = config.DEFAULT_TEMPERATURE if temperature is None else temperature
+        tool_names = tuple(tool.name for tool in tools)
+
+        def build():
+            llm = self.get_model(model_name=model_name, temperature=temperature)
+            return llm.bind_tools(tools=tools).with_config(tags=[assistant_type])
+        
+        return self._get_or_build((model_name, temperature, tool_names, assistant_type), build)
+    
+    
+    def warm_up(self, tools: list, model_name: str | None = None):
+        """Pre-builds the bound runnable of every assistant type."""
+        for assistant_type in config.ALL_SYSTEM_PROMPTS:
+            self.get_runnable(tools=tools, model_name=model_name, assistant_type=assistant_type)
+    
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "cached_runnables": len(self._runnables),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+    
+    
+    async def aclose(self):
+        with self._build_lock:
+            self._runnables = dict()
+            http_client, http_async_client = self._http_client, self._http_async_client
+            self._http_client = self._http_async_client = None
+        if http_client is not None:
+            http_client.close()
+        if http_async_client is not None:
+            await http_async_client.aclose()
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException, status, Form, File, UploadFile
+from fastapi import APIRouter, HTTPException, status, Form, File, UploadFile, Query
 from app.schemas.chat import ChatRequest
 from app.core.chat_service import ChatService
-from app.core.vector_service import VectorService
-from app.core.persistence.repositories import ChatRepository, MessageRepository, DocumentRepository
-from app.core.persistence.db_sessions import get_session
+from app.core.uploads import save_upload, is_valid_chat_id, upload_filename, UploadTooLargeError, InvalidUploadError
+from app.core.ingestion import IngestionManager, IngestionJob
+from app.tools.cache import ToolResultCache
+from app.core.persistence.repositories import ChatRepository, MessageRepository
+from app.core.persistence.db_sessions import run_in_session
+from app.core import config
 from fastapi.responses import StreamingResponse
+from utilities.utils import encode_cursor, decode_cursor
+from typing import Literal
+import asyncio
+import json
 
 
 
@@ -13,55 +20,194 @@ router = APIRouter()
 
 
 @router.post("/chat")
-def chat_stream(request: ChatRequest) -> StreamingResponse:
-    stream = ChatService().handle_user_message(chat_id=request.chat_id, prompt=request.message)
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    stream = await ChatService().handle_user_message(chat_id=request.chat_id, prompt=request.message)
     return StreamingResponse(stream, media_type="text/plain")
 
 
 
+def _serialize_message(message, with_keys: bool = False) -> dict:
+    result = {
+        "role": message.role, 
+        "content": message.content,
+        "tool_calls": message.tool_calls
+    }
+    if with_keys:
+        result.update(id=message.id, 
+                      tool_call_id=message.tool_call_id, 
+                      tool_name=message.tool_name, 
+                      created_at=message.created_at)
+    return result
+
+
+
+def _load_chat(session, chat_id: str, limit: int, before: tuple | None) -> dict | None:
+    chat = ChatRepository.get_by_id(db_session=session, chat_id=chat_id)
+    if chat is None:
+        return None
+    chat_messages = MessageRepository.get_page(db_session=session, chat_id=chat_id, limit=limit, before=before)
+    # a full page means older messages may exist
+    next_cursor = None
+    if len(chat_messages) == limit:
+        next_cursor = encode_cursor(chat_messages[0].created_at, chat_messages[0].id)
+    return {
+        "status": "ok", 
+        "id": chat_id, 
+        'chat_title': chat.title, 
+        "messages": [_serialize_message(message) for message in chat_messages],
+        "next_cursor": next_cursor
+        }
+
+
+
+def _load_chat_title(session, chat_id: str) -> tuple[bool, str | None]:
+    chat = ChatRepository.get_by_id(db_session=session, chat_id=chat_id)
+    return chat is not None, chat.title if chat is not None else None
+
+
+
+def _load_message_batch(session, chat_id: str, after: tuple | None) -> list[dict]:
+    messages = MessageRepository.get_page_after(db_session=session, chat_id=chat_id, 
+                                                limit=config.EXPORT_BATCH_SIZE, after=after)
+    return [_serialize_message(message, with_keys=True) for message in messages]
+
+
+
+def _load_chat_page(session, limit: int, before: tuple | None) -> list[dict]:
+    chats = ChatRepository.get_page(db_session=session, limit=limit, before=before)
+    return [{"id": chat.id, "title": chat.title, "updated_at": chat.updated_at} for chat in chats]
+
+
+
+async def _export_chat(chat_id: str, chat_title: str | None):
+    yield json.dumps({"type": "chat", "id": chat_id, "chat_title": chat_title}, ensure_ascii=False) + "\n"
+    after = None
+    while True:
+        # one short session per batch, so a long export never pins a connection
+        batch = await run_in_session(_load_message_batch, chat_id, after)
+        for message in batch:
+            yield json.dumps({"type": "message", **message}, ensure_ascii=False, default=str) + "\n"
+        if len(batch) < config.EXPORT_BATCH_SIZE:
+            break
+        after = (batch[-1]["created_at"], batch[-1]["id"])
+
+
+
+async def _export_all_chats():
+    before = None
+    while True:
+        batch = await run_in_session(_load_chat_page, config.EXPORT_BATCH_SIZE, before)
+        for chat in batch:
+            yield json.dumps(chat, ensure_ascii=False, default=str) + "\n"
+        if len(batch) < config.EXPORT_BATCH_SIZE:
+            break
+        before = (batch[-1]["updated_at"], batch[-1]["id"])
+
+
+
+def _parse_cursor(cursor: str | None) -> tuple | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+
 @router.get("/chat/{chat_id}")
-def get_chat(chat_id: str):
-    with get_session() as session:
-        assert session is not None
-        chat = ChatRepository.get_by_id(db_session=session, chat_id=chat_id)
-        if chat is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Chat not found"
-            )
-        chat_messages = MessageRepository.get_messages_by_chat_id(db_session=session, chat_id=chat_id)
-        results = {
-            "status": "ok", 
-            "id": chat_id, 
-            'chat_title': chat.title, 
-            "messages": [
-                    {
-                        "role": message.role, 
-                        "content": message.content,
-                        "tool_calls": message.tool_calls
-                    } for message in chat_messages
-                ]
-            }
+async def get_chat(chat_id: str, 
+                   limit: int = Query(config.MESSAGE_PAGE_SIZE, ge=1, le=config.MAX_PAGE_SIZE),
+                   cursor: str | None = None,
+                   format: Literal["json", "ndjson"] = "json"):
+    if format == "ndjson":
+        found, chat_title = await run_in_session(_load_chat_title, chat_id)
+        if not found:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+        return StreamingResponse(_export_chat(chat_id, chat_title), media_type="application/x-ndjson")
+    
+    results = await run_in_session(_load_chat, chat_id, limit, _parse_cursor(cursor))
+    if results is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found"
+        )
     return results
 
 
 
 @router.get("/all-chats")
-def all_chats():
-    with get_session() as session:
-        assert session is not None
-        chats =  ChatRepository.get_all(db_session=session)
-        results = {
-            "status": "ok", 
-            "chats": [ 
-                    {"id": chat.id, 
-                        "title": chat.title, 
-                        "updated_at": chat.updated_at
-                        } for chat in chats
-                ]
-            }
+async def all_chats(limit: int = Query(config.CHAT_LIST_PAGE_SIZE, ge=1, le=config.MAX_PAGE_SIZE),
+                    cursor: str | None = None,
+                    format: Literal["json", "ndjson"] = "json"):
+    if format == "ndjson":
+        return StreamingResponse(_export_all_chats(), media_type="application/x-ndjson")
+    
+    chats = await run_in_session(_load_chat_page, limit, _parse_cursor(cursor))
+    next_cursor = None
+    if len(chats) == limit:
+        next_cursor = encode_cursor(chats[-1]["updated_at"], chats[-1]["id"])
+    
     # returning the chat lists
-    return results
+    return {
+        "status": "ok", 
+        "chats": chats,
+        "next_cursor": next_cursor
+        }
+
+
+
+def _ensure_chat(session, chat_id: str, title: str | None):
+    if ChatRepository.get_by_id(db_session=session, chat_id=chat_id) is None:
+        ChatRepository.create(db_session=session, chat_id=chat_id, title=title)
+
+
+
+async def _submit_upload(chat_id: str, file: UploadFile, title: str | None) -> IngestionJob:
+    if not is_valid_chat_id(chat_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, 
+                            detail="Invalid chat id.")
+    try:
+        filename = upload_filename(file.filename)
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not filename.endswith(('.pdf', '.txt', '.csv')):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, 
+                            detail=f"Unsupported file type: {filename}")
+    try:
+        upload = await save_upload(file=file, chat_id=chat_id)
+        # statistics over a file of the same name were computed on its previous content
+        ToolResultCache().invalidate(tool_name='calculate_statistics', chat_id=chat_id)
+        await run_in_session(_ensure_chat, chat_id, title)
+        return IngestionManager().submit(chat_id=chat_id, filename=upload.filename, file_path=upload.file_path,
+                                         file_hash=upload.sha256, size_bytes=upload.size_bytes)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
+                            detail="Too many documents are being processed, please retry shortly.")
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
+                            detail=f"Failed to process docuemnt: {str(e)}")
+
+
+
+@router.post("/upload", status_code=status.HTTP_202_ACCEPTED)
+async def upload(chat_id: str = Form(...), file: UploadFile = File(...)):
+    # ingesting the file into ChromaDB in the background
+    job = await _submit_upload(chat_id=chat_id, file=file, title=file.filename)
+    return {"status": "ok", "job": job.to_dict()}
+
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = IngestionManager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return {"status": "ok", "job": job.to_dict()}
 
 
 
@@ -69,34 +215,15 @@ def all_chats():
 async def upload_and_query(chat_id: str = Form(...), 
                            message: str = Form(...), 
                            file: UploadFile = File(...)) -> StreamingResponse:
-    # ingesting the file into CharomaDB
-    file_content = await file.read()
-    vector_service = VectorService()
+    job = await _submit_upload(chat_id=chat_id, file=file, title=message[:60])
     
-    if not file.filename:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, 
-                            detail="File must need to have a name.")
+    # the question is about this very document, so giving its job a bounded head start
+    # (an async wait: no thread is held and other chats are not affected)
     try:
-        file_path = await vector_service.ingest_file(file_content=file_content,
-                                                    filename=file.filename,
-                                                    chat_id=chat_id)
-        with get_session() as session:
-            assert session is not None
-            chat = ChatRepository.get_by_id(db_session=session, chat_id=chat_id)
-            if not chat:
-                ChatRepository.create(db_session=session, chat_id=chat_id, title=message[:60])
-                
-            # saving the uploaded document
-            DocumentRepository.create(db_session=session,
-                                        chat_id=chat_id,
-                                        filename=file.filename,
-                                        collection_name=f'chat_{chat_id}',
-                                        file_path=file_path)
-    except Exception as e:
-        session.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-                            detail=f"Failed to process docuemnt: {str(e)}")
+        await asyncio.wait_for(job.done.wait(), timeout=config.UPLOAD_AND_QUERY_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        pass
     
     # calling the chat service
-    stream = ChatService().handle_user_message(chat_id=chat_id, prompt=message)
-    return StreamingResponse(stream, media_type="text/plain")
\ No newline at end of file
+    stream = await ChatService().handle_user_message(chat_id=chat_id, prompt=message)
+    return StreamingResponse(stream, media_type="text/plain", headers={"X-Ingestion-Job": job.id})
@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.agents.llm_registry import LLMRegistry
+from app.agents.agents import RouteStats
+from app.tools.cache import ToolResultCache
+from app.core.persistence.write_behind import WriteBehindQueue
+from app.core.memory import ChatManager
+from app.core.embeddings import EmbeddingService
+from app.core.vector_store import VectorStoreRegistry
+from app.core.readiness import Readiness
+from app.core.ingestion import IngestionManager
+
+
+
+router = APIRouter()
+
+
+
+@router.get("/metrics")
+def metrics():
+    return {
+        "status": "ok",
+        "llm_registry": LLMRegistry().stats(),
+        "model_router": RouteStats().stats(),
+        "tool_cache": ToolResultCache().stats(),
+        "write_behind": WriteBehindQueue().stats(),
+        "chat_cache": ChatManager().stats(),
+        "embeddings": EmbeddingService().stats(),
+        "vector_store": VectorStoreRegistry().stats(),
+        "ingestion": IngestionManager().stats()
+    }
+
+
+
+@router.get("/healthz")
+def healthz():
+    # liveness only: the process is up and serving requests
+    return {"status": "ok"}
+
+
+
+@router.get("/readyz")
+def readyz():
+    report = Readiness().report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, 
+                        content={"status": "ok" if report["ready"] else "starting", **report})
@@ -1,49 +1,176 @@
 from langchain.messages import HumanMessage, AIMessage, ToolMessage
-from app.core.persistence.repositories import ChatRepository, MessageRepository
-from app.core.memory import ChatManager
-from app.core.persistence.db_sessions import get_session
+from app.core.memory import ChatManager, ChatMemory
+from app.core.context_window import estimate_tokens, message_tokens, fit_to_budget, get_token_budget
+from app.core.persistence.write_behind import WriteBehindQueue
+from app.core.persistence.db_sessions import run_in_session
+from app.core.persistence.repositories import DocumentRepository
 from app.agents import agents
 from app.tools.registry import TOOL_REGISTRY
+from app.tools.knowledge_base import search_chat_documents
+from typing import AsyncGenerator
+import asyncio
+import weakref
 import json
 from app.core import config
 
 
 
 class ChatService:
+    # bounding the tool calls running at once across all the conversations of this worker
+    _tool_semaphores = weakref.WeakKeyDictionary()
+
     def __init__(self):
         self.chat_manager = ChatManager()
+        self.writer = WriteBehindQueue()
+
+
+    @classmethod
+    def _get_tool_semaphore(cls) -> asyncio.Semaphore:
+        # one per event loop, created on first use: a semaphore is bound to the loop it first waits on
+        loop = asyncio.get_running_loop()
+        semaphore = cls._tool_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = cls._tool_semaphores[loop] = asyncio.Semaphore(config.MAX_CONCURRENT_TOOL_CALLS)
+        return semaphore
+
+
+    async def _execute_tool_call(self, tool_call: dict, chat_id: str) -> ToolMessage:
+        # --- WORKAROUND: Groq "Name+Args" Hallucination ---
+        raw_name = tool_call.get("name", "")
+        tool_args = tool_call.get("args", {})
+        tool_id = tool_call.get("id")
+        
+        # cleaning JSON in name strings
+        clean_name = raw_name.split("{")[0].strip() if "{" in raw_name else raw_name
+        # getting which tool is requested
+        tool_func = TOOL_REGISTRY.get(clean_name)
+        
+        if not tool_func:
+            print(f"!!! Tool '{clean_name}' not found in registry")
+            # every tool call needs a reply, or the next model call is rejected
+            observation = {'ok': False, 'error': f"Tool '{clean_name}' does not exist."}
+            return ToolMessage(content=json.dumps(observation, ensure_ascii=False), tool_call_id=tool_id, name=clean_name)
+        
+        if clean_name in config.CHAT_SCOPED_TOOLS:
+            tool_args['chat_id'] = chat_id
 
-    def handle_user_message(self, chat_id: str, prompt: str):
-        # persistence logic
-        with get_session() as session:
-            if ChatRepository.get_by_id(db_session=session, chat_id=chat_id) is None:
-                ChatRepository.create(db_session=session, chat_id=chat_id, title=prompt[:60])
+        # executing the requested tool (sync tools are moved to a worker thread)
+        timeout = config.TOOL_TIMEOUTS.get(clean_name, config.DEFAULT_TOOL_TIMEOUT)
+        try:
+            async with self._get_tool_semaphore():
+                observation = await asyncio.wait_for(tool_func.ainvoke(tool_args), timeout=timeout)
+            content_str = json.dumps(observation, ensure_ascii=False)
+        except asyncio.TimeoutError:
+            content_str = json.dumps({'ok': False, 'error': f"Tool '{clean_name}' timed out after {timeout} seconds."})
+        except Exception as e:
+            # failing tools and results that cannot be serialized are reported to the model
+            print(f"!!! Tool '{clean_name}' failed: {str(e)}")
+            content_str = json.dumps({'ok': False, 'error': str(e)}, ensure_ascii=False)
             
-            MessageRepository.create(db_session=session, chat_id=chat_id, role="user", content=prompt)
-            ChatRepository.touch(db_session=session, chat_id=chat_id)
+        return ToolMessage(content=content_str, tool_call_id=tool_id, name=clean_name)
+
+
+    async def _prefetch_context(self, chat_id: str, prompt: str) -> str | None:
+        """Retrieves the chat's document chunks relevant to the prompt, if any, for the rag_assistant prompt."""
+        try:
+            results = await asyncio.wait_for(
+                asyncio.to_thread(search_chat_documents, chat_id=chat_id, query=prompt, k=config.TOP_K),
+                timeout=config.RAG_PREFETCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"!!! Retrieval prefetch timed out for chat {chat_id}")
+            return None
+        except Exception as e:
+            print(f"!!! Retrieval prefetch failed for chat {chat_id}: {str(e)}")
+            return None
+        
+        relevant = [text for text, relevance in results or [] if relevance >= config.RAG_MIN_RELEVANCE]
+        return "\n---\n".join(relevant) if relevant else None
+
+
+    def _build_context(self, current_chat: ChatMemory, model_name: str, assistant_type: str, extra_context: str | None) -> list:
+        """
+        The prompt history for the model's token budget. Turns stay in the window until a rolling
+        summary has folded them: once the history passes SUMMARY_TRIGGER_RATIO of the budget, the
+        oldest turns down to SUMMARY_TARGET_RATIO are summarized in the background. While that runs,
+        the window may overrun the budget up to CONTEXT_OVERRUN_RATIO; only past it (a failing
+        summarizer) are the oldest turns cut, and they are folded by the next summary.
+        """
+        budget = (get_token_budget(model_name) 
+                  - estimate_tokens(config.get_system_prompt(assistant_type))
+                  - estimate_tokens(extra_context)
+                  - estimate_tokens(current_chat.summary))
+        messages = current_chat.get_messages()
+        window, overflow = fit_to_budget(messages, int(budget * config.CONTEXT_OVERRUN_RATIO))
+        window_tokens = sum(message_tokens(message) for message in window)
+        if overflow or window_tokens > budget * config.SUMMARY_TRIGGER_RATIO:
+            # the folded turns are the ones outside the lower watermark, the cut ones included
+            _, fold = fit_to_budget(messages, int(budget * config.SUMMARY_TARGET_RATIO))
+            self._schedule_summary(current_chat, current_chat.get_overflow() + fold)
+        return window
+    
+    
+    def _schedule_summary(self, current_chat: ChatMemory, messages: list):
+        # one summary at a time per chat; turns passing the watermark meanwhile are folded by the next one
+        if not messages or (current_chat.summary_task is not None and not current_chat.summary_task.done()):
+            return
         
-        current_chat = self.chat_manager.get_chat(chat_id)
-        last_message_in_memory = current_chat.get_messages()[-1]
-        if not isinstance(last_message_in_memory, HumanMessage):
+        async def summarize():
+            try:
+                summary = await agents.summarize_conversation(current_chat.summary, messages)
+            except Exception as e:
+                print(f"!!! Rolling summary failed: {str(e)}")
+                return
+            current_chat.apply_summary(summary, messages)
+        
+        current_chat.summary_task = asyncio.create_task(summarize())
+
+
+    async def handle_user_message(self, chat_id: str, prompt: str) -> AsyncGenerator[str, None]:
+        # speculative retrieval, running alongside the request setup below
+        prefetch = asyncio.create_task(self._prefetch_context(chat_id, prompt)) if config.RAG_ENABLED else None
+        has_documents = asyncio.create_task(run_in_session(DocumentRepository.has_documents, chat_id=chat_id))
+        
+        # persistence logic (group committed in the background)
+        self.writer.ensure_chat(chat_id=chat_id, title=prompt[:60])
+        self.writer.add_message(chat_id=chat_id, role="user", content=prompt)
+        self.writer.touch(chat_id=chat_id)
+        
+        # a cold chat is refilled from the database: flushing first, so the refill sees every queued write
+        if not self.chat_manager.has_chat(chat_id):
+            await self.writer.flush()
+        current_chat = await asyncio.to_thread(self.chat_manager.get_chat, chat_id)
+        messages_in_memory = current_chat.get_messages()
+        if not messages_in_memory or not isinstance(messages_in_memory[-1], HumanMessage):
             current_chat.add_message(HumanMessage(content=prompt)) 
 
         # default config initialization
         assistant_type = config.DEFAULT_ASSISTANT_TYPE
         extra_context = None
         
-        # dynamic intent detection
-        # TODO [Optional]: here, we can add Dynamic System Controlled RAG, based on prompt analysis
+        # system controlled RAG: relevant document context goes straight into the prompt,
+        # so the model answers without a query_knowledge_base round-trip
+        if prefetch is not None:
+            extra_context = await prefetch
+            if extra_context:
+                assistant_type = "rag_assistant"
         
-        def token_stream():
-            history = current_chat.get_messages()
-
+        # only the tools this request can use are bound, sparing their schemas in the prompt
+        tools = agents.select_tools(prompt, has_documents=await has_documents)
+        
+        async def token_stream():
+            stage = "initial"
             while True:
                 full_content = ""
                 tool_calls = []
+                # the model is routed per call: a pass that only phrases tool results may use the small one
+                model_name, route = agents.route_model(prompt, stage=stage, assistant_type=assistant_type)
+                history = self._build_context(current_chat, model_name, assistant_type, extra_context)
 
                 # --- STEP 1: GENERATE & STREAM ---
                 try:
-                    for chunk in agents.get_stream(messages=history, assitant_type=assistant_type, extra_context=extra_context):
+                    async for chunk in agents.get_stream(messages=history, assitant_type=assistant_type, 
+                                                         extra_context=extra_context, summary=current_chat.summary, 
+                                                         tools=tools, model_name=model_name, route=route):
                         # collecting tool metadata
                         if chunk.tool_calls:
                             tool_calls.extend(chunk.tool_calls)
@@ -73,59 +200,33 @@ class ChatService:
 
                 # --- STEP 2: CHECK & EXECUTE TOOLS ---
                 if tool_calls:
-                    # saving ai intent
-                    with get_session() as session:
-                        MessageRepository.create(
-                            db_session=session, 
-                            chat_id=chat_id, 
-                            role="assistant", 
-                            content=full_content or "Searching my tools...",
-                            tool_calls=tool_calls 
-                        )
-        
                     ai_msg = AIMessage(content=full_content, tool_calls=tool_calls)
-                    history.append(ai_msg)
                     current_chat.add_message(ai_msg)
 
-                    for tc in tool_calls:
-                        # --- WORKAROUND: Groq "Name+Args" Hallucination ---
-                        raw_name = tc.get("name", "")
-                        tool_args = tc.get("args", {})
-                        tool_id = tc.get("id")
-                        
-                        # cleaning JSON in name strings
-                        clean_name = raw_name.split("{")[0].strip() if "{" in raw_name else raw_name
-                        # getting which tool is requested
-                        tool_func = TOOL_REGISTRY.get(clean_name)
-                        
-                        if tool_func:
-                            if clean_name == 'query_knowledge_base':
-                                tool_args['chat_id'] = chat_id
-
-                            # executing the requested tool
-                            observation = tool_func.invoke(tool_args)
-                                
-                            content_str = json.dumps(observation, ensure_ascii=False)
-                            
-                            # preparing and storing tool message object
-                            tool_msg = ToolMessage(content=content_str, tool_call_id=tool_id, name=clean_name)
-                            current_chat.add_message(tool_msg)
-                            history.append(tool_msg)
-                            
-                            # saving into the database
-                            with get_session() as session:
-                                MessageRepository.create(session, chat_id, "tool", content_str, tool_id, clean_name)
-                        else:
-                            print(f"!!! Tool '{clean_name}' not found in registry")
+                    # running all the requested tools of this turn concurrently
+                    tool_msgs = await asyncio.gather(*(self._execute_tool_call(tc, chat_id) for tc in tool_calls))
+                    
+                    # saving ai intent and the tool results in one batch
+                    rows = [{"role": "assistant", 
+                             "content": full_content or "Searching my tools...", 
+                             "tool_calls": tool_calls}]
+                    for tool_msg in tool_msgs:
+                        # results are kept in the original call order
+                        current_chat.add_message(tool_msg)
+                        rows.append({"role": "tool", 
+                                     "content": tool_msg.content, 
+                                     "tool_call_id": tool_msg.tool_call_id, 
+                                     "tool_name": tool_msg.name})
+                    
+                    self.writer.add_messages(chat_id=chat_id, messages=rows)
                     
-                    # tool results are added to history; loop back for the AI to answer
+                    # tool results are added to the chat memory; loop back for the AI to answer
+                    stage = "tool_followup"
                     continue 
 
                 # --- STEP 3: PERSIST FINAL RESPONSE ---
                 if full_content.strip():
-                    with get_session() as session:
-                        MessageRepository.create(session, chat_id, "assistant", full_content)
-                        session.commit()
+                    self.writer.add_message(chat_id=chat_id, role="assistant", content=full_content)
                     current_chat.add_message(AIMessage(content=full_content))
                 
                 # finally, breaking the while loop
@@ -134,4 +235,4 @@ class ChatService:
         return token_stream()
     
     
-     
\ No newline at end of file
+     
@@ -1,3 +1,9 @@
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+
 # LLM Config
 DEFAULT_MODEL = "openai/gpt-oss-20b"
 NEW_OPENAI_MODEL = "openai/gpt-oss-120b"
@@ -6,6 +12,31 @@ MIN_TEMPERATURE = 0.0
 MAX_TEMPERATURE = 1.0
 MAX_OUTPUT_TOKENS = 1024
 
+# Model Routing: each turn goes to the model of the first matching rule (stage, assistant type,
+# prompt size in estimated tokens, keywords), MODEL_ROUTING_DEFAULT when none matches
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+MODEL_ROUTING_DEFAULT = NEW_OPENAI_MODEL
+MODEL_ROUTING_RULES = [
+    {"route": "rag", "assistant_type": "rag_assistant", "model": NEW_OPENAI_MODEL},
+    {"route": "tool_followup", "stage": "tool_followup", "model": DEFAULT_MODEL},
+    {"route": "long_prompt", "min_prompt_tokens": 150, "model": NEW_OPENAI_MODEL},
+    {"route": "reasoning", "model": NEW_OPENAI_MODEL,
+     "keywords": ["explain", "why", "how does", "prove", "derive", "analyze", "analyse", "compare", "design",
+                  "code", "debug", "algorithm", "step by step", "pros and cons", "evaluate", "essay"]},
+    {"route": "short_prompt", "max_prompt_tokens": 40, "model": DEFAULT_MODEL},
+]
+# retries on another model while nothing was streamed yet: fallbacks after an error, escalations after an empty reply
+MODEL_FALLBACKS = {DEFAULT_MODEL: NEW_OPENAI_MODEL, NEW_OPENAI_MODEL: DEFAULT_MODEL}
+MODEL_ESCALATIONS = {DEFAULT_MODEL: NEW_OPENAI_MODEL}
+MODEL_ROUTING_LOG = os.getenv("MODEL_ROUTING_LOG", "false").lower() == "true"   # prints the latency of every routed call
+MODEL_ROUTING_LATENCY_WINDOW = 500                                                # latencies kept per route for /metrics
+
+# shared keep-alive HTTP pool used by every LLM client
+LLM_HTTP_MAX_CONNECTIONS = 100
+LLM_HTTP_MAX_KEEPALIVE = 20
+LLM_HTTP_KEEPALIVE_EXPIRY = 60.0
+LLM_HTTP_TIMEOUT = 60.0
+
 
 # System Config
 DEFAULT_ASSISTANT_TYPE = "general_assistant"
@@ -50,15 +81,179 @@ ALL_SYSTEM_PROMPTS = {
         "methodology only if necessary for verification."
     ),
 }
+# Tool Execution Config
+MAX_CONCURRENT_TOOL_CALLS = 8
+# tools that get the chat_id of the request injected (documents and uploads are per chat)
+CHAT_SCOPED_TOOLS = {"query_knowledge_base", "calculate_statistics"}
+DEFAULT_TOOL_TIMEOUT = 20.0
+TOOL_TIMEOUTS = {
+    "get_weather_data": 15.0,
+    "query_knowledge_base": 30.0,
+    "calculate_statistics": 30.0,
+}
+
+
+# Expression Evaluator Config (evaluate_expression): hard limits on the cost of one evaluation
+EXPRESSION_MAX_LENGTH = 1000           # characters
+EXPRESSION_MAX_NODES = 300             # parsed elements
+EXPRESSION_MAX_ARRAY_SIZE = 100_000    # values of one list variable
+EXPRESSION_MAX_COST = 2_000_000        # values computed in total (array operations count each element)
+EXPRESSION_MAX_INT_BITS = 14_000       # size of exact integer results, under Python's 4300-digit str() limit
+EXPRESSION_MAX_FACTORIAL = 1000
+
+
+# Statistics Config (calculate_statistics over uploaded CSV/TXT files)
+STATS_CHUNK_ROWS = 65_536              # values parsed and folded into the running moments at a time
+STATS_MAX_VALUES = 10_000_000
+
+
+# Time Tools Config
+TIMEZONE_CACHE_SIZE = 512              # resolved ZoneInfo objects kept by get_zone
+TIME_TOOLS_MAX_ITEMS = 100             # results of one batch call
+
+
+# Tool Selection Config
+# tools bound only for chats with uploaded documents
+DOCUMENT_TOOLS = {"query_knowledge_base"}
+# keyword routing: only the tools whose keywords appear in the prompt are bound, or every tool when
+# none matches; tools without keywords are always bound. Bound variants are cached by LLMRegistry.
+TOOL_ROUTING_ENABLED = os.getenv("TOOL_ROUTING_ENABLED", "false").lower() == "true"
+TOOL_ROUTING_KEYWORDS = {
+    "get_weather_data": ["weather", "temperature", "forecast", "rain", "snow", "wind", "humidity", "sunny", "cloudy"],
+    "get_current_time": ["time", "clock", "now", "today", "date"],
+    "calculate_date_relative": ["date", "day", "days", "week", "weeks", "month", "months", "year", "years", 
+                                "ago", "later", "before", "after", "deadline", "tomorrow", "yesterday"],
+    "convert_time_zones": ["time zone", "timezone", "utc", "gmt", "convert", "est", "pst", "ist", "cet"],
+    "get_current_time_batch": ["time", "clock", "now", "cities", "countries", "zones", "timezones"],
+    "calculate_date_relative_batch": ["dates", "deadlines", "milestones", "schedule", "ago", "later", "before", "after"],
+    "convert_time_zones_batch": ["time zone", "timezone", "timezones", "utc", "gmt", "convert", "meeting", "cities"],
+    "scientific_calculator": ["calculate", "compute", "sqrt", "square root", "log", "sin", "cos", "tan", 
+                              "power", "factorial", "percent", "multiply", "divide", "sum"],
+    "evaluate_expression": ["calculate", "compute", "evaluate", "formula", "expression", "equation", "sqrt", 
+                            "square root", "log", "interest", "compound", "percent", "power", "sum", "total"],
+    "calculate_statistics": ["mean", "median", "average", "mode", "variance", "std", "deviation", 
+                             "percentile", "statistics", "stats", "csv", "column", "dataset"],
+}
+
+
+# Tool Result Cache Config
+TOOL_CACHE_MAX_ENTRIES = 1024
+# TTL in seconds per tool: None caches forever, 0 (or a missing tool) never caches
+TOOL_CACHE_TTLS = {
+    "get_weather_data": 600,
+    "get_current_time": 0,
+    "calculate_date_relative": 60,
+    "convert_time_zones": None,
+    "get_current_time_batch": 0,
+    "calculate_date_relative_batch": 60,
+    "convert_time_zones_batch": None,
+    "scientific_calculator": None,
+    "evaluate_expression": None,
+    "calculate_statistics": None,         # file-based results are dropped when the chat uploads a file
+    "query_knowledge_base": 300,
+}
+# tools whose string args are compared case-insensitively (e.g. city names)
+TOOL_CACHE_CASE_INSENSITIVE = {"get_weather_data"}
+
+
+# Database Config
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./synapse.db")
+# optional async driver URL (e.g. "sqlite+aiosqlite:///./synapse.db" or "postgresql+asyncpg://...")
+DATABASE_ASYNC_URL = os.getenv("DATABASE_ASYNC_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_CACHE_SIZE_KB = 65536
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+
+# Pagination Config
+CHAT_LIST_PAGE_SIZE = 50
+MESSAGE_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 500
+
+
+# Write-Behind Persistence Config
+WRITE_BEHIND_FLUSH_INTERVAL = 0.05   # seconds between group commits
+WRITE_BEHIND_MAX_BATCH = 500         # a queue this deep triggers an early flush
+
+
 # Chat Memory Config
-MEMORY_WINDOW_SIZE = 6
+# the token budget decides which messages are prompted; this count is only a safety cap on a chat's memory
+MEMORY_MAX_MESSAGES = 100
+# token-budgeted prompts: tokens are estimated locally as characters / CHARS_PER_TOKEN
+CHARS_PER_TOKEN = 4
+MESSAGE_TOKEN_OVERHEAD = 4                  # role and separators of each message
+CONTEXT_TOKEN_BUDGETS = {                   # prompt tokens per model (system prompt, context, summary, history)
+    "openai/gpt-oss-20b": 6000,
+    "openai/gpt-oss-120b": 8000,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET = 6000
+TOOL_RESULT_MAX_TOKENS = 800                # tool results are cut down to this in prompts (stored in full)
+# older turns are folded into a rolling summary, off the critical path, by the small model: once the history
+# passes SUMMARY_TRIGGER_RATIO of the budget, the turns beyond SUMMARY_TARGET_RATIO are folded (and stay
+# in the window until the summary is stored), so each summary call frees room ahead of time
+SUMMARY_MODEL = DEFAULT_MODEL
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_MAX_PENDING_MESSAGES = 50
+SUMMARY_TRIGGER_RATIO = 0.8
+SUMMARY_TARGET_RATIO = 0.5
+CONTEXT_OVERRUN_RATIO = 1.5                 # window bound while a summary is pending (the models take far more)
+# bounds of ChatManager's in-process chat cache
+CHAT_CACHE_MAX_CHATS = 1000
+CHAT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+CHAT_CACHE_IDLE_TTL = 3600.0     # seconds; None keeps idle chats until evicted by size
+CHAT_CACHE_POLICY = "lru"        # "lru" or "lfu"
 
 
 # RAG config
-RAG_ENABLED = False
+# RAG_ENABLED: retrieval for chats with documents is prefetched with the prompt and injected into the
+# rag_assistant prompt, sparing the tool round-trip; chunks below RAG_MIN_RELEVANCE (cosine) are not injected
+RAG_ENABLED = os.getenv("RAG_ENABLED", "false").lower() == "true"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 TOP_K = 5
+RAG_MIN_RELEVANCE = 0.35
+RAG_PREFETCH_TIMEOUT = 3.0      # seconds; on timeout the model falls back to the query_knowledge_base tool
+# content store: a chat's vectors live in one of VECTOR_SHARD_COUNT collections ("synapse_content_00", ...),
+# picked by a hash of the chat id and tagged with `chat_id` metadata for retrieval to filter on;
+# changing the count needs a run of `python -m app.core.vector_migration`
+CONTENT_COLLECTION = "synapse_content"
+VECTOR_SHARD_COUNT = int(os.getenv("VECTOR_SHARD_COUNT", "8"))
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+VECTOR_HANDLE_CACHE_SIZE = 32    # open collection handles kept by the shared Chroma client
+
+# Upload Config
+UPLOAD_DIR = './uploads'
+UPLOAD_CHUNK_SIZE = 1024 * 1024                             # bytes read and written per step
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_FORM_OVERHEAD_BYTES = 1024 * 1024                   # the other form fields and multipart framing
+# CSV uploads are data for calculate_statistics; chunking and embedding their rows is opt-in
+INDEX_CSV_UPLOADS = os.getenv("INDEX_CSV_UPLOADS", "false").lower() == "true"
+
+
+# Ingestion Jobs Config
+INGESTION_QUEUE_SIZE = 32                                   # pending uploads beyond this are rejected
+INGESTION_CONCURRENCY = 2                                   # jobs processed at once
+INGESTION_PROCESS_WORKERS = min(4, os.cpu_count() or 1)     # parser processes
+INGESTION_PAGES_PER_TASK = 8                                # pages parsed and split per process pool task
+INGESTION_PARSE_QUEUE_SIZE = 2 * INGESTION_PROCESS_WORKERS  # parsed page ranges buffered ahead of embedding
+INGESTION_BATCH_SIZE = 128                                  # chunks embedded and stored per batch
+INGESTION_JOB_HISTORY = 1000
+UPLOAD_AND_QUERY_WAIT_SECONDS = 30.0                        # /upload-and-query waits this long for its own job
+
+# Embedding Config (one shared model for ingestion and retrieval)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", "0")) or None   # None keeps torch's default
+EMBEDDING_WARMUP = True
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256"))   # ~170k vectors of all-MiniLM-L6-v2
 
 
 # Dynamic Configurations
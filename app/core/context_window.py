@@ -0,0 +1,71 @@
+from langchain.messages import HumanMessage, AIMessage, ToolMessage
+from app.core import config
+import json
+
+
+
+def estimate_tokens(text: str | None) -> int:
+    """Cheap local token count: about CHARS_PER_TOKEN characters per token, rounded up."""
+    if not text:
+        return 0
+    return -(-len(text) // config.CHARS_PER_TOKEN)
+
+
+def message_tokens(message: HumanMessage | AIMessage | ToolMessage) -> int:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    tokens = estimate_tokens(content) + config.MESSAGE_TOKEN_OVERHEAD
+    if isinstance(message, AIMessage) and message.tool_calls:
+        tokens += estimate_tokens(json.dumps(message.tool_calls, default=str))
+    return tokens
+
+
+def get_token_budget(model_name: str) -> int:
+    return config.CONTEXT_TOKEN_BUDGETS.get(model_name, config.DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+
+def truncate_tool_message(message: ToolMessage, max_tokens: int = config.TOOL_RESULT_MAX_TOKENS) -> ToolMessage:
+    """A copy of the tool result cut down to `max_tokens`; the stored message keeps the full result."""
+    if not isinstance(message.content, str) or estimate_tokens(message.content) <= max_tokens:
+        return message
+    max_chars = max_tokens * config.CHARS_PER_TOKEN
+    dropped = len(message.content) - max_chars
+    return ToolMessage(content=f"{message.content[:max_chars]}... [truncated {dropped} characters]",
+                       tool_call_id=message.tool_call_id, name=message.name)
+
+
+def group_turns(messages: list) -> list[list]:
+    """
+    Splits a history into the units trimming may drop: an AIMessage with tool calls together
+    with the ToolMessages answering it, or a single message. Tool results whose call is
+    no longer in the history are dropped, since the API rejects them.
+    """
+    groups = []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            if groups and isinstance(groups[-1][0], AIMessage) and groups[-1][0].tool_calls:
+                groups[-1].append(message)
+            continue
+        groups.append([message])
+    return groups
+
+
+def fit_to_budget(messages: list, budget: int) -> tuple[list, list]:
+    """
+    (window, overflow): the newest whole turn groups whose tokens fit into `budget`, with tool
+    results truncated, and the older messages left out. The newest group is always kept.
+    """
+    groups = group_turns(messages)
+    kept = []
+    used = 0
+    for group in reversed(groups):
+        window_group = [truncate_tool_message(message) if isinstance(message, ToolMessage) else message
+                        for message in group]
+        tokens = sum(message_tokens(message) for message in window_group)
+        if kept and used + tokens > budget:
+            break
+        kept.append(window_group)
+        used += tokens
+
+    overflow = [message for group in groups[:len(groups) - len(kept)] for message in group]
+    window = [message for group in reversed(kept) for message in group]
+    return window, overflow
@@ -0,0 +1,169 @@
+from app.core import config
+from threading import Lock
+from array import array
+import hashlib
+import sqlite3
+import time
+import os
+
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of embedding vectors keyed by (model, SHA-256 of the text), in its own
+    SQLite file as float32 blobs. Repeated queries and chunks shared by documents
+    skip the embedding model; the least recently used vectors are evicted once
+    the stored vectors exceed EMBEDDING_CACHE_MAX_MB.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(EmbeddingCache, cls).__new__(cls)
+                    cls._instance._conn = None
+                    cls._instance._db_lock = Lock()
+                    cls._instance.max_bytes = int(config.EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+                    cls._instance._entries = 0
+                    cls._instance._bytes = 0
+                    cls._instance._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        return cls._instance
+
+
+    def _get_conn(self) -> sqlite3.Connection:
+        # caller holds _db_lock
+        if self._conn is None:
+            directory = os.path.dirname(config.EMBEDDING_CACHE_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(config.EMBEDDING_CACHE_PATH, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_access ON embeddings (last_access)")
+            conn.commit()
+            self._entries, self._bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+            self._conn = conn
+        return self._conn
+
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Cached vectors in the order of the texts, None for the misses"""
+        hashes = [self.text_hash(text) for text in texts]
+        found = dict()
+        with self._db_lock:
+            conn = self._get_conn()
+            # staying well under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = list(set(hashes[start:start + 500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT text_hash, vector FROM embeddings "
+                                    f"WHERE model = ? AND text_hash IN ({placeholders})", [model, *batch])
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                                 [(now, model, text_hash) for text_hash in found])
+                conn.commit()
+
+        vectors = [found.get(text_hash) for text_hash in hashes]
+        hits = sum(vector is not None for vector in vectors)
+        self._stats["hits"] += hits
+        self._stats["misses"] += len(vectors) - hits
+        return vectors
+
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        now = time.time()
+        rows = dict()
+        for text, vector in zip(texts, vectors):
+            rows[self.text_hash(text)] = array("f", vector).tobytes()
+        if not rows:
+            return
+        with self._db_lock:
+            conn = self._get_conn()
+            hashes = list(rows)
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                replaced_entries, replaced_bytes = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings "
+                                                                f"WHERE model = ? AND text_hash IN ({placeholders})", [model, *batch]).fetchone()
+                self._entries -= replaced_entries
+                self._bytes -= replaced_bytes
+            conn.executemany("INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                             [(model, text_hash, blob, now) for text_hash, blob in rows.items()])
+            self._entries += len(rows)
+            self._bytes += sum(len(blob) for blob in rows.values())
+            self._evict(conn)
+            conn.commit()
+
+
+    def _evict(self, conn: sqlite3.Connection):
+        # caller holds _db_lock; evicting down to 90% so that eviction does not run on every put
+        if self._bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target and self._entries:
+            victims = conn.execute("SELECT model, text_hash, LENGTH(vector) FROM embeddings "
+                                   "ORDER BY last_access ASC LIMIT 500").fetchall()
+            if not victims:
+                break
+            freed = 0
+            evicted = 0
+            for model, text_hash, size in victims:
+                if self._bytes - freed <= target:
+                    break
+                conn.execute("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", (model, text_hash))
+                freed += size
+                evicted += 1
+            self._bytes -= freed
+            self._entries -= evicted
+            self._stats["evictions"] += evicted
+
+
+    def clear(self):
+        with self._db_lock:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM embeddings")
+            conn.commit()
+            self._entries = 0
+            self._bytes = 0
+
+
+    def close(self):
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+    def stats(self) -> dict:
+        with self._db_lock:
+            # the entry and size counters are loaded with the connection
+            self._get_conn()
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": self._entries,
+            "size_mb": round(self._bytes / (1024 * 1024), 3),
+            "max_mb": config.EMBEDDING_CACHE_MAX_MB
+        }
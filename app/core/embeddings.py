@@ -0,0 +1,130 @@
+from langchain_core.embeddings import Embeddings
+from app.core.embedding_cache import EmbeddingCache
+from app.core import config
+from threading import Lock
+import time
+
+
+
+class EmbeddingService(Embeddings):
+    """
+    The single, lazily loaded embedding model of the process, shared by document
+    ingestion (VectorService) and retrieval (query_knowledge_base).
+    Encoding is serialized, since HF fast tokenizers are not safe to share across threads.
+    Vectors already in the on-disk EmbeddingCache are served from it without running the model.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(EmbeddingService, cls).__new__(cls)
+                    cls._instance._model = None
+                    cls._instance._load_lock = Lock()
+                    cls._instance._encode_lock = Lock()
+                    cls._instance.model_name = config.EMBEDDING_MODEL
+                    cls._instance.cache = EmbeddingCache() if config.EMBEDDING_CACHE_ENABLED else None
+                    cls._instance._stats = {
+                        "load_seconds": 0.0,
+                        "documents_embedded": 0,
+                        "document_batches": 0,
+                        "document_seconds": 0.0,
+                        "queries_embedded": 0,
+                        "query_seconds": 0.0,
+                    }
+
+        return cls._instance
+    
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+    
+    
+    def _get_model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    # heavy import (torch, transformers), deferred until the model is needed
+                    from langchain_huggingface import HuggingFaceEmbeddings
+                    if config.EMBEDDING_NUM_THREADS:
+                        import torch
+                        torch.set_num_threads(config.EMBEDDING_NUM_THREADS)
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name,
+                                                        model_kwargs={"device": config.EMBEDDING_DEVICE},
+                                                        encode_kwargs={"batch_size": config.EMBEDDING_BATCH_SIZE})
+                    self._stats["load_seconds"] = round(time.perf_counter() - started, 3)
+        return self._model
+    
+    
+    def _encode_documents(self, texts: list[str]) -> list[list[float]]:
+        model = self._get_model()
+        started = time.perf_counter()
+        with self._encode_lock:
+            vectors = model.embed_documents(texts)
+        self._stats["document_seconds"] += time.perf_counter() - started
+        self._stats["documents_embedded"] += len(texts)
+        self._stats["document_batches"] += 1
+        return vectors
+    
+    
+    def _encode_query(self, text: str) -> list[float]:
+        model = self._get_model()
+        started = time.perf_counter()
+        with self._encode_lock:
+            vector = model.embed_query(text)
+        self._stats["query_seconds"] += time.perf_counter() - started
+        self._stats["queries_embedded"] += 1
+        return vector
+    
+    
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._encode_documents(texts)
+        
+        vectors = self.cache.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            encoded = dict(zip(missing, self._encode_documents(missing)))
+            self.cache.put_many(self.model_name, missing, list(encoded.values()))
+            vectors = [encoded[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+    
+    
+    def embed_query(self, text: str) -> list[float]:
+        if self.cache is None:
+            return self._encode_query(text)
+        
+        # query vectors get their own key space: some models encode queries differently from documents
+        query_model = f"{self.model_name}#query"
+        vector = self.cache.get_many(query_model, [text])[0]
+        if vector is None:
+            vector = self._encode_query(text)
+            self.cache.put_many(query_model, [text], [vector])
+        return vector
+    
+    
+    def warm_up(self):
+        """Loads the model and runs one encode, so the first real request pays neither."""
+        # bypassing the cache, which would otherwise answer without loading the model
+        self._encode_query("warm up")
+    
+    
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        document_seconds = stats.pop("document_seconds")
+        query_seconds = stats.pop("query_seconds")
+        stats.update(
+            model=self.model_name,
+            loaded=self.is_loaded,
+            chunks_per_second=round(stats["documents_embedded"] / document_seconds, 2) if document_seconds else 0.0,
+            avg_batch_latency_ms=round(document_seconds * 1000 / stats["document_batches"], 3) if stats["document_batches"] else 0.0,
+            avg_query_latency_ms=round(query_seconds * 1000 / stats["queries_embedded"], 3) if stats["queries_embedded"] else 0.0,
+            cache=self.cache.stats() if self.cache is not None else None
+        )
+        return stats
@@ -0,0 +1,250 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from app.core import config
+from app.core.vector_service import VectorService, chunk_hash, count_pages, load_and_split
+from app.core.vector_store import shard_name
+from app.core.persistence.db_sessions import run_in_session
+from app.core.persistence.repositories import DocumentRepository
+from app.tools.cache import ToolResultCache
+import multiprocessing
+import asyncio
+import time
+import uuid
+
+
+
+@dataclass
+class IngestionJob:
+    chat_id: str
+    filename: str
+    file_path: str
+    file_hash: str | None = None
+    size_bytes: int | None = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"          # queued -> parsing -> embedding -> done | failed
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "chat_id": self.chat_id,
+            "filename": self.filename,
+            "file_hash": self.file_hash,
+            "size_bytes": self.size_bytes,
+            "status": self.status,
+            "pages_parsed": self.pages_parsed,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_reused": self.chunks_reused,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+
+class IngestionManager:
+    """
+    Runs document ingestion as background jobs, off the event loop.
+    Each job is a pipeline: page ranges are parsed and split in parallel on a process pool,
+    fed through a bounded queue, then embedded and stored batch by batch on a worker thread
+    against the shared embedding model. A bounded queue also caps the pending uploads.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(IngestionManager, cls).__new__(cls)
+                    cls._instance._jobs = OrderedDict()
+                    cls._instance._queue = None
+                    cls._instance._workers = []
+                    cls._instance._process_pool = None
+
+        return cls._instance
+    
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # spawn: never forking a process that already runs threads and an event loop
+            self._process_pool = ProcessPoolExecutor(max_workers=config.INGESTION_PROCESS_WORKERS,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+        return self._process_pool
+    
+    
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=config.INGESTION_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(config.INGESTION_CONCURRENCY)]
+    
+    
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+    
+    
+    def submit(self, chat_id: str, filename: str, file_path: str, 
+               file_hash: str | None = None, size_bytes: int | None = None) -> IngestionJob:
+        """Queues a job and returns at once; raises asyncio.QueueFull when the queue is at capacity."""
+        if self._queue is None:
+            self.start()
+        job = IngestionJob(chat_id=chat_id, filename=filename, file_path=file_path, 
+                           file_hash=file_hash, size_bytes=size_bytes)
+        self._queue.put_nowait(job)
+        
+        self._jobs[job.id] = job
+        # keeping a bounded history of finished jobs
+        while len(self._jobs) > config.INGESTION_JOB_HISTORY:
+            oldest_id = next(iter(self._jobs))
+            if not self._jobs[oldest_id].done.is_set():
+                break
+            del self._jobs[oldest_id]
+        return job
+    
+    
+    def get(self, job_id: str) -> IngestionJob | None:
+        return self._jobs.get(job_id)
+    
+    
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"!!! Ingestion job {job.id} ({job.filename}) failed: {str(e)}")
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+                self._queue.task_done()
+    
+    
+    @staticmethod
+    def _find_indexed_copy(session, file_hash: str, chat_id: str) -> tuple[str, str, list[str]] | None:
+        """(chat id, collection, chunk ids) of an indexed document with this file, of this chat if it has one"""
+        document = (DocumentRepository.get_indexed_by_file_hash(db_session=session, file_hash=file_hash, chat_id=chat_id)
+                    or DocumentRepository.get_indexed_by_file_hash(db_session=session, file_hash=file_hash))
+        if document is None:
+            return None
+        return document.chat_id, document.collection_name, list(document.chunk_hashes)
+    
+    
+    async def _register_document(self, job: IngestionJob, chunk_hashes: list[str]):
+        # the document is registered only once it is searchable
+        await run_in_session(DocumentRepository.create, 
+                             chat_id=job.chat_id, 
+                             filename=job.filename,
+                             collection_name=shard_name(job.chat_id), 
+                             file_path=job.file_path,
+                             file_hash=job.file_hash,
+                             chunk_hashes=chunk_hashes)
+        # the chat's knowledge base changed, so its cached lookups are stale
+        ToolResultCache().invalidate(tool_name='query_knowledge_base', chat_id=job.chat_id)
+    
+    
+    async def _process(self, job: IngestionJob):
+        # a CSV stays a file for calculate_statistics unless CSV indexing is enabled
+        if job.file_path.endswith('.csv') and not config.INDEX_CSV_UPLOADS:
+            job.status = "done"
+            return
+        
+        # a known file is not parsed nor embedded again: another chat's vectors are copied over
+        if job.file_hash:
+            indexed = await run_in_session(self._find_indexed_copy, job.file_hash, job.chat_id)
+            if indexed is not None:
+                source_chat_id, source_collection, chunk_hashes = indexed
+                if source_chat_id == job.chat_id:
+                    job.chunks_total = job.chunks_reused = len(chunk_hashes)
+                    job.status = "done"
+                    return
+                copied = await asyncio.to_thread(VectorService().copy_chunks, source_collection, 
+                                                 source_chat_id, job.chat_id, chunk_hashes)
+                # an incomplete source (e.g. a store not migrated yet) is indexed from the file instead
+                if copied == len(chunk_hashes):
+                    job.chunks_total = job.chunks_reused = copied
+                    await self._register_document(job, chunk_hashes)
+                    job.status = "done"
+                    return
+        
+        loop = asyncio.get_running_loop()
+        pool = self._get_process_pool()
+        job.status = "parsing"
+        total_pages = await loop.run_in_executor(pool, count_pages, job.file_path)
+        
+        # parsing and chunking: page ranges on the process pool, at most INGESTION_PARSE_QUEUE_SIZE in flight
+        parsed = asyncio.Queue(maxsize=config.INGESTION_PARSE_QUEUE_SIZE)
+        async def produce():
+            for start_page in range(0, total_pages, config.INGESTION_PAGES_PER_TASK):
+                await parsed.put(loop.run_in_executor(pool, load_and_split, job.file_path, 
+                                                      start_page, start_page + config.INGESTION_PAGES_PER_TASK,
+                                                      config.CHUNK_SIZE, config.CHUNK_OVERLAP))
+            await parsed.put(None)
+        producer = asyncio.create_task(produce())
+        
+        # embedding (unseen chunks only) and storing, one batch at a time while the next pages are parsed
+        vector_service = VectorService()
+        chunk_ids = dict()      # unique chunk ids of the file, in order
+        pending = dict()
+        async def store(batch: dict):
+            # parsing and embedding overlap; the job is reported as embedding from its first batch on
+            job.status = "embedding"
+            reused = await asyncio.to_thread(vector_service.upsert_chunks, job.chat_id, batch)
+            job.chunks_reused += reused
+            job.chunks_embedded += len(batch) - reused
+        
+        try:
+            while (parse_task := await parsed.get()) is not None:
+                pages, chunks = await parse_task
+                job.pages_parsed += pages
+                for text, metadata in chunks:
+                    chunk_id = chunk_hash(text)
+                    # dropping the repeated chunks of the file itself, keeping the first occurrence
+                    if chunk_id not in chunk_ids:
+                        chunk_ids[chunk_id] = None
+                        pending[chunk_id] = (text, metadata)
+                job.chunks_total = len(chunk_ids)
+                
+                while len(pending) >= config.INGESTION_BATCH_SIZE:
+                    batch_ids = list(pending)[:config.INGESTION_BATCH_SIZE]
+                    await store({chunk_id: pending.pop(chunk_id) for chunk_id in batch_ids})
+            
+            if pending:
+                await store(pending)
+        finally:
+            producer.cancel()
+            # the page ranges still queued are not needed any more
+            while not parsed.empty():
+                parse_task = parsed.get_nowait()
+                if parse_task is not None:
+                    parse_task.cancel()
+        
+        await self._register_document(job, list(chunk_ids))
+        job.status = "done"
+    
+    
+    def stats(self) -> dict:
+        statuses = dict()
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": config.INGESTION_QUEUE_SIZE,
+            "jobs": statuses
+        }
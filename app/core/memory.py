@@ -2,28 +2,191 @@ from app.core import config
 from langchain.messages import HumanMessage, AIMessage, ToolMessage
 from app.core.persistence.repositories import MessageRepository
 from app.core.persistence import db_sessions
+from collections import OrderedDict
 from threading import Lock
+import json
+import time
 
 
 class ChatMemory:
     def __init__(self):
         self._messages = list()
         self._lock = Lock()
-        self.max_size = config.MEMORY_WINDOW_SIZE * 2
+        self.max_size = config.MEMORY_MAX_MESSAGES
+        self.approx_bytes = 0
+        # rolling summary of the turns folded out of the window, and the trimmed turns not folded in yet
+        self.summary = None
+        self.summary_task = None
+        self._overflow = list()
+        
+    
+    @staticmethod
+    def _approx_size(message: HumanMessage | AIMessage | ToolMessage) -> int:
+        size = len(message.content) if isinstance(message.content, str) else len(json.dumps(message.content, default=str))
+        if isinstance(message, AIMessage) and message.tool_calls:
+            size += len(json.dumps(message.tool_calls, default=str))
+        return size
         
 
     def get_messages(self) -> list:
         with self._lock:
             return self._messages.copy()
     
+    def get_overflow(self) -> list:
+        with self._lock:
+            return self._overflow.copy()
+    
     def add_message(self, message: HumanMessage | AIMessage | ToolMessage):
         if not isinstance(message, (HumanMessage, AIMessage, ToolMessage)):
             raise ValueError("messages must be a HumanMessage, AIMessage, or ToolMessage instance")
         with self._lock:
             self._messages.append(message)
+            self.approx_bytes += self._approx_size(message)
             if len(self._messages) > self.max_size:
-                self._messages = self._messages[-self.max_size:]
+                cut = len(self._messages) - self.max_size
+                # never keeping tool results without the AIMessage that called them
+                while cut < len(self._messages) - 1 and isinstance(self._messages[cut], ToolMessage):
+                    cut += 1
+                # trimmed turns wait for the next rolling summary, up to a bound
+                self._overflow.extend(self._messages[:cut])
+                self._messages = self._messages[cut:]
+                for dropped in self._overflow[:-config.SUMMARY_MAX_PENDING_MESSAGES]:
+                    self.approx_bytes -= self._approx_size(dropped)
+                self._overflow = self._overflow[-config.SUMMARY_MAX_PENDING_MESSAGES:]
+    
+    def apply_summary(self, summary: str, folded: list):
+        """Stores a new rolling summary and drops the messages folded into it."""
+        folded_ids = {id(message) for message in folded}
+        with self._lock:
+            for message in self._messages + self._overflow:
+                if id(message) in folded_ids:
+                    self.approx_bytes -= self._approx_size(message)
+            self._messages = [message for message in self._messages if id(message) not in folded_ids]
+            self._overflow = [message for message in self._overflow if id(message) not in folded_ids]
+            self.approx_bytes += len(summary) - len(self.summary or "")
+            self.summary = summary
+        
+
+
+class ChatCache:
+    """
+    Bounded in-process cache of ChatMemory objects.
+    Caps both the number of resident chats and their approximate byte size,
+    evicting by LRU or LFU, and expires chats idle for longer than `idle_ttl` seconds.
+    Evicted chats are simply refilled from the database on their next turn.
+    """
+    def __init__(self, max_chats: int, max_bytes: int, idle_ttl: float | None, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError("policy must be either 'lru' or 'lfu'")
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.policy = policy
+        # chat_id -> [memory, last_access, access_count], kept in recency order
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"capacity": 0, "bytes": 0, "idle": 0}
+    
+    
+    def __contains__(self, chat_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            return entry is not None and not self._is_idle(entry, time.monotonic())
+    
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    
+    def _is_idle(self, entry: list, now: float) -> bool:
+        return self.idle_ttl is not None and now - entry[1] > self.idle_ttl
+    
+    
+    def _resident_bytes(self) -> int:
+        return sum(entry[0].approx_bytes for entry in self._entries.values())
+    
+    
+    def _victim(self, keep: str | None = None) -> str:
+        candidates = (chat_id for chat_id in self._entries if chat_id != keep)
+        if self.policy == "lfu":
+            # least frequently used; the recency order breaks the ties
+            return min(candidates, key=lambda chat_id: self._entries[chat_id][2])
+        return next(candidates)
+    
+    
+    def _enforce_limits(self, keep: str | None = None):
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, entry in self._entries.items() if self._is_idle(entry, now)]:
+            del self._entries[chat_id]
+            self.evictions["idle"] += 1
+        
+        while len(self._entries) > max(self.max_chats, 1):
+            del self._entries[self._victim(keep)]
+            self.evictions["capacity"] += 1
         
+        # chats grow after being cached, so the byte budget is re-checked on every access
+        resident_bytes = self._resident_bytes()
+        while resident_bytes > self.max_bytes and len(self._entries) > 1:
+            resident_bytes -= self._entries.pop(self._victim(keep))[0].approx_bytes
+            self.evictions["bytes"] += 1
+    
+    
+    def get(self, chat_id: str) -> ChatMemory | None:
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            now = time.monotonic()
+            if entry is None or self._is_idle(entry, now):
+                if entry is not None:
+                    del self._entries[chat_id]
+                    self.evictions["idle"] += 1
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+            entry[1] = now
+            entry[2] += 1
+            self._entries.move_to_end(chat_id)
+            self._enforce_limits(keep=chat_id)
+            return entry[0]
+    
+    
+    def put(self, chat_id: str, memory: ChatMemory):
+        with self._lock:
+            self._entries[chat_id] = [memory, time.monotonic(), 1]
+            self._entries.move_to_end(chat_id)
+            self._enforce_limits(keep=chat_id)
+    
+    
+    def pop(self, chat_id: str, default=None):
+        with self._lock:
+            entry = self._entries.pop(chat_id, None)
+        return default if entry is None else entry[0]
+    
+    
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+    
+    
+    def stats(self) -> dict:
+        with self._lock:
+            resident_chats = len(self._entries)
+            resident_bytes = self._resident_bytes()
+        total = self.hits + self.misses
+        return {
+            "policy": self.policy,
+            "resident_chats": resident_chats,
+            "resident_bytes": resident_bytes,
+            "max_chats": self.max_chats,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": dict(self.evictions)
+        }
+
 
 
 class ChatManager:
@@ -35,24 +198,38 @@ class ChatManager:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super(ChatManager, cls).__new__(cls)
-                    cls._instance.all_chats = dict()
+                    cls._instance.all_chats = ChatCache(max_chats=config.CHAT_CACHE_MAX_CHATS,
+                                                        max_bytes=config.CHAT_CACHE_MAX_BYTES,
+                                                        idle_ttl=config.CHAT_CACHE_IDLE_TTL,
+                                                        policy=config.CHAT_CACHE_POLICY)
                     cls._instance._write_lock = Lock()
 
         return cls._instance
     
 
+    def has_chat(self, chat_id: str) -> bool:
+        return chat_id in self.all_chats
+    
+
     def get_chat(self, chat_id: str):
-        if chat_id not in self.all_chats:
+        chat = self.all_chats.get(chat_id)
+        if chat is None:
             with self._write_lock:
-                if chat_id not in self.all_chats:
-                    self.all_chats[chat_id] = self._refill_chat_from_db(chat_id=chat_id)
-        return self.all_chats[chat_id]
+                # another thread may have refilled it while we were waiting
+                if chat_id in self.all_chats:
+                    chat = self.all_chats.get(chat_id)
+                if chat is None:
+                    chat = self._refill_chat_from_db(chat_id=chat_id)
+                    self.all_chats.put(chat_id, chat)
+        return chat
     
     
     def _refill_chat_from_db(self, chat_id: str):
         chat_memory = ChatMemory()
         with db_sessions.get_session() as session:
-            messages = MessageRepository.get_messages_by_chat_id(db_session=session, chat_id=chat_id)
+            # only the tail that fits into the memory window is loaded
+            messages = MessageRepository.get_recent_messages_by_chat_id(db_session=session, chat_id=chat_id,
+                                                                        limit=chat_memory.max_size)
             for message in messages:
                 if message.role == "user":
                     chat_memory.add_message(HumanMessage(content=message.content))
@@ -74,6 +251,10 @@ class ChatManager:
     
     def reset_all(self):
         with self._write_lock:
-            self.all_chats = dict()
+            self.all_chats.clear()
+    
+    
+    def stats(self) -> dict:
+        return self.all_chats.stats()
 
 
@@ -1,18 +1,79 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from app.core import config
 
 
 Base = declarative_base()
 
-DATABASE_URL = "sqlite:///./synapse.db"
+DATABASE_URL = config.DATABASE_URL
+DATABASE_ASYNC_URL = config.DATABASE_ASYNC_URL
 
-engine = create_engine(url=DATABASE_URL,
-                       connect_args={"check_same_thread": False}
-                    )
+
+def _engine_options(url: str) -> dict:
+   options = {"pool_pre_ping": True}
+   if url.startswith("sqlite"):
+      options["connect_args"] = {"check_same_thread": False}
+      # in-memory databases live in a single connection, so they keep SQLAlchemy's default pool
+      if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+         return options
+   options.update(pool_size=config.DB_POOL_SIZE,
+                  max_overflow=config.DB_MAX_OVERFLOW,
+                  pool_timeout=config.DB_POOL_TIMEOUT,
+                  pool_recycle=config.DB_POOL_RECYCLE)
+   return options
+
+
+def _register_sqlite_pragmas(sync_engine: Engine) -> None:
+   """
+   WAL lets readers (/all-chats, /chat/{id}) run while a turn is being written;
+   synchronous=NORMAL is durable under WAL and skips the fsync per commit.
+   """
+   @event.listens_for(sync_engine, "connect")
+   def _apply_pragmas(dbapi_connection, connection_record):
+      cursor = dbapi_connection.cursor()
+      cursor.execute("PRAGMA journal_mode=WAL")
+      cursor.execute("PRAGMA synchronous=NORMAL")
+      cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+      cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+      cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+      cursor.execute("PRAGMA temp_store=MEMORY")
+      cursor.close()
+
+
+engine = create_engine(url=DATABASE_URL, **_engine_options(DATABASE_URL))
+if engine.dialect.name == "sqlite":
+   _register_sqlite_pragmas(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+# optional async engine (aiosqlite / asyncpg), used by `db_sessions.run_in_session` when configured
+async_engine = None
+AsyncSessionLocal = None
+if DATABASE_ASYNC_URL:
+   from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+   async_engine = create_async_engine(DATABASE_ASYNC_URL, **_engine_options(DATABASE_ASYNC_URL))
+   if async_engine.dialect.name == "sqlite":
+      _register_sqlite_pragmas(async_engine.sync_engine)
+   AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _add_missing_columns() -> None:
+   """Adds nullable columns introduced after a table was first created (create_all never alters tables)."""
+   inspector = inspect(engine)
+   with engine.begin() as connection:
+      for table in Base.metadata.sorted_tables:
+         if not inspector.has_table(table.name):
+            continue
+         existing = {column["name"] for column in inspector.get_columns(table.name)}
+         for column in table.columns:
+            if column.name not in existing and column.nullable:
+               column_type = column.type.compile(dialect=engine.dialect)
+               connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
 def init_db() -> None:
    """
    Initialize database tables explicitly.
@@ -20,4 +81,16 @@ def init_db() -> None:
    """
    from app.core.persistence import models   # noqa: F401
 
-   Base.metadata.create_all(bind=engine)
\ No newline at end of file
+   Base.metadata.create_all(bind=engine)
+   _add_missing_columns()
+   # create_all skips existing tables, so indexes added later are created here
+   for table in Base.metadata.sorted_tables:
+      for index in table.indexes:
+         index.create(bind=engine, checkfirst=True)
+
+
+async def dispose_engines() -> None:
+   """Closes every pooled connection (called on shutdown)."""
+   engine.dispose()
+   if async_engine is not None:
+      await async_engine.dispose()
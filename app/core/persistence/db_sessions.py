@@ -1,11 +1,16 @@
+import asyncio
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Callable, Generator, TypeVar
 
 from sqlalchemy.orm import Session
 
+from app.core.persistence import db
 from app.core.persistence.db import SessionLocal
 
 
+T = TypeVar("T")
+
+
 @contextmanager
 def get_session() -> Generator[Session, None, None]:
     """
@@ -20,3 +25,26 @@ def get_session() -> Generator[Session, None, None]:
         raise
     finally:
         session.close()
+
+
+async def run_in_session(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """
+    Run `fn(session, *args, **kwargs)` inside its own transactional scope without
+    blocking the event loop: through the async engine when one is configured,
+    otherwise on a worker thread.
+    """
+    if db.AsyncSessionLocal is not None:
+        async with db.AsyncSessionLocal() as session:
+            try:
+                result = await session.run_sync(fn, *args, **kwargs)
+                await session.commit()
+                return result
+            except Exception:
+                await session.rollback()
+                raise
+
+    def _call() -> T:
+        with get_session() as session:
+            return fn(session, *args, **kwargs)
+
+    return await asyncio.to_thread(_call)
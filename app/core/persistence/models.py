@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import String, Integer, Text, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy import func
 from app.core.persistence.db import Base
@@ -9,6 +9,10 @@ from datetime import datetime
 
 class Chat(Base):
     __tablename__ = "chats"
+    __table_args__ = (
+        # serves the keyset pagination of /all-chats
+        Index("ix_chats_updated_at_id", "updated_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, index=True)
     title: Mapped[str | None] = mapped_column(String, nullable=True)
@@ -22,6 +26,10 @@ class Chat(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # serves the chronological (and tail-window) reads of a chat
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     chat_id: Mapped[str] = mapped_column(String, ForeignKey("chats.id", ondelete="CASCADE"), index=True)
@@ -43,9 +51,12 @@ class Document(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     chat_id: Mapped[str] = mapped_column(String, ForeignKey("chats.id", ondelete="CASCADE"), index=True)
     filename: Mapped[str] = mapped_column(String(255), nullable=False)
-    # collection_name will match the ChromaDB collection ID for strict isolation
+    # collection_name will match the ChromaDB collection ID (the chat's content shard, filtered by chat_id metadata)
     collection_name: Mapped[str] = mapped_column(String(100), nullable=False)
     file_path: Mapped[str] = mapped_column(String(500), nullable=False)
+    # content addressing: SHA-256 of the file and, in order, of its unique chunks (vector ids are "{chat_id}:{chunk hash}")
+    file_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    chunk_hashes: Mapped[list | None] = mapped_column(JSON, nullable=True)
     
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
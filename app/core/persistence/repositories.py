@@ -1,7 +1,20 @@
 from sqlalchemy.orm import Session
 from app.core.persistence.models import Chat, Message, Document
 from sqlalchemy.sql import func
-from sqlalchemy import update
+from sqlalchemy import update, or_, and_, literal, String
+from datetime import datetime
+
+
+
+def _keyset_timestamp(db_session: Session, value: datetime):
+    """
+    SQLite stores server-side timestamps as 'YYYY-MM-DD HH:MM:SS' text while SQLAlchemy binds
+    datetimes with microseconds, which would break the text comparison of a keyset cursor.
+    """
+    if db_session.get_bind().dialect.name == "sqlite":
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if value.microsecond else "%Y-%m-%d %H:%M:%S"
+        return literal(value.strftime(fmt), String)
+    return value
 
 
 
@@ -15,6 +28,16 @@ class ChatRepository:
     def get_all(db_session: Session):
         return db_session.query(Chat).order_by(Chat.updated_at.desc()).all()
     
+    @staticmethod
+    def get_page(db_session: Session, limit: int, before: tuple[datetime, str] | None = None) -> list[Chat]:
+        """Most recently updated chats first; `before` is the (updated_at, id) keyset of the previous page's last chat"""
+        query = db_session.query(Chat)
+        if before is not None:
+            updated_at = _keyset_timestamp(db_session, before[0])
+            query = query.filter(or_(Chat.updated_at < updated_at,
+                                     and_(Chat.updated_at == updated_at, Chat.id < before[1])))
+        return query.order_by(Chat.updated_at.desc(), Chat.id.desc()).limit(limit).all()
+    
     @staticmethod
     def create(db_session: Session, chat_id: str, title: str | None) -> Chat:
         chat = Chat(id=chat_id, title=title)
@@ -30,6 +53,30 @@ class ChatRepository:
             .values(updated_at=func.now())
         )
         db_session.commit()
+    
+    @staticmethod
+    def get_missing_ids(db_session: Session, chat_ids: set[str]) -> set[str]:
+        existing = db_session.query(Chat.id).filter(Chat.id.in_(chat_ids)).all()
+        return set(chat_ids) - {row.id for row in existing}
+    
+    @staticmethod
+    def create_many(db_session: Session, chats: dict[str, str | None], commit: bool = True) -> list[Chat]:
+        """Create Multiple Chats ({chat_id: title}), optionally leaving the commit to the caller"""
+        new_chats = [Chat(id=chat_id, title=title) for chat_id, title in chats.items()]
+        db_session.add_all(new_chats)
+        if commit:
+            db_session.commit()
+        return new_chats
+    
+    @staticmethod
+    def touch_many(db_session: Session, chat_ids: set[str], commit: bool = True):
+        db_session.execute(
+            update(Chat)
+            .where(Chat.id.in_(chat_ids))
+            .values(updated_at=func.now())
+        )
+        if commit:
+            db_session.commit()
         
         
         
@@ -48,6 +95,16 @@ class MessageRepository:
         return message
     
     
+    @staticmethod
+    def create_many(db_session: Session, chat_id: str, messages: list[dict], commit: bool = True) -> list[Message]:
+        """Create Multiple Entries in Messages Table with a Single Commit (order is preserved)"""
+        new_messages = [Message(chat_id=chat_id, **message) for message in messages]
+        db_session.add_all(new_messages)
+        if commit:
+            db_session.commit()
+        return new_messages
+    
+    
     @staticmethod
     def get_messages_by_chat_id(db_session: Session, chat_id: str) -> list[Message]:
         return (db_session
@@ -56,15 +113,118 @@ class MessageRepository:
                 .order_by(Message.created_at.asc(), Message.id.asc())
                 .all()
             )
+    
+    
+    @staticmethod
+    def get_page(db_session: Session, chat_id: str, limit: int, 
+                 before: tuple[datetime, int] | None = None) -> list[Message]:
+        """
+        One page of a chat, newest page first, returned in chronological order.
+        `before` is the (created_at, id) keyset of the oldest message of the previous page.
+        """
+        query = db_session.query(Message).filter(Message.chat_id == chat_id)
+        if before is not None:
+            created_at = _keyset_timestamp(db_session, before[0])
+            query = query.filter(or_(Message.created_at < created_at,
+                                     and_(Message.created_at == created_at, Message.id < before[1])))
+        messages = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).all()
+        messages.reverse()
+        return messages
+    
+    
+    @staticmethod
+    def get_page_after(db_session: Session, chat_id: str, limit: int,
+                       after: tuple[datetime, int] | None = None) -> list[Message]:
+        """Chronological keyset scan (oldest first), used for full exports."""
+        query = db_session.query(Message).filter(Message.chat_id == chat_id)
+        if after is not None:
+            created_at = _keyset_timestamp(db_session, after[0])
+            query = query.filter(or_(Message.created_at > created_at,
+                                     and_(Message.created_at == created_at, Message.id > after[1])))
+        return query.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit).all()
+    
+    
+    @staticmethod
+    def get_recent_messages_by_chat_id(db_session: Session, chat_id: str, limit: int) -> list[Message]:
+        """
+        Returns the last `limit` messages of a chat in chronological order (served by the
+        (chat_id, created_at, id) index). The window never starts with tool results
+        whose assistant tool call fell outside of it.
+        """
+        messages = (db_session
+                    .query(Message)
+                    .filter(Message.chat_id == chat_id)
+                    .order_by(Message.created_at.desc(), Message.id.desc())
+                    .limit(limit)
+                    .all()
+                )
+        messages.reverse()
+        
+        start = 0
+        while start < len(messages) and messages[start].role == "tool":
+            start += 1
+        return messages[start:]
         
     
 
 class DocumentRepository:
     @staticmethod
     def create(db_session: Session, chat_id: str, filename: str, 
-               collection_name: str, file_path: str) -> Document:
+               collection_name: str, file_path: str, 
+               file_hash: str | None = None, chunk_hashes: list[str] | None = None) -> Document:
         new_document = Document(chat_id=chat_id, filename=filename, 
-                            collection_name=collection_name, file_path=file_path)
+                            collection_name=collection_name, file_path=file_path,
+                            file_hash=file_hash, chunk_hashes=chunk_hashes)
         db_session.add(new_document)
         db_session.commit()
-        return new_document
\ No newline at end of file
+        return new_document
+    
+    
+    @staticmethod
+    def get_by_chat_id(db_session: Session, chat_id: str) -> list[Document]:
+        return db_session.query(Document).filter(Document.chat_id == chat_id).all()
+    
+    
+    @staticmethod
+    def get_collection_names(db_session: Session, chat_id: str) -> list[str]:
+        """The vector collections holding the chat's documents (no document rows are loaded)"""
+        rows = db_session.query(Document.collection_name).filter(Document.chat_id == chat_id).distinct().all()
+        return [collection_name for (collection_name,) in rows]
+    
+    
+    @staticmethod
+    def has_documents(db_session: Session, chat_id: str) -> bool:
+        return db_session.query(db_session.query(Document.id).filter(Document.chat_id == chat_id).exists()).scalar()
+    
+    
+    @staticmethod
+    def get_indexed_by_file_hash(db_session: Session, file_hash: str, chat_id: str | None = None) -> Document | None:
+        """Any document (optionally of one chat) whose content with this hash is already in the content store"""
+        query = (db_session
+                 .query(Document)
+                 .filter(Document.file_hash == file_hash, Document.chunk_hashes.isnot(None)))
+        if chat_id is not None:
+            query = query.filter(Document.chat_id == chat_id)
+        return query.order_by(Document.id.asc()).first()
+    
+    
+    @staticmethod
+    def get_by_collection_name(db_session: Session, collection_name: str) -> list[Document]:
+        return db_session.query(Document).filter(Document.collection_name == collection_name).all()
+    
+    
+    @staticmethod
+    def get_by_collection_names(db_session: Session, collection_names: list[str]) -> list[Document]:
+        return db_session.query(Document).filter(Document.collection_name.in_(collection_names)).all()
+    
+    
+    @staticmethod
+    def set_content_index(db_session: Session, document_id: int, collection_name: str, 
+                          chunk_hashes: list[str], file_hash: str | None = None):
+        """Points a document at its chunks in the content store."""
+        db_session.execute(
+            update(Document)
+            .where(Document.id == document_id)
+            .values(collection_name=collection_name, chunk_hashes=chunk_hashes, file_hash=file_hash)
+        )
+        db_session.commit()
\ No newline at end of file
@@ -0,0 +1,185 @@
+from collections import deque
+from threading import Lock
+from app.core import config
+from app.core.persistence.db_sessions import run_in_session
+from app.core.persistence.repositories import ChatRepository, MessageRepository
+import asyncio
+import time
+
+
+
+class WriteBehindQueue:
+    """
+    Write-behind persistence for chat turns.
+    Message inserts, chat creations and `updated_at` touches from all in-flight conversations
+    are queued in FIFO order and applied by a single background flusher as one group commit,
+    so per-chat ordering is preserved while every turn skips its own fsync'd commits.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(WriteBehindQueue, cls).__new__(cls)
+                    cls._instance._pending = deque()
+                    cls._instance._pending_lock = Lock()
+                    cls._instance._flush_lock = None
+                    cls._instance._wakeup = None
+                    cls._instance._task = None
+                    cls._instance._stopping = False
+                    cls._instance._stats = {
+                        "flushes": 0,
+                        "flushed_ops": 0,
+                        "failures": 0,
+                        "dropped_ops": 0,
+                        "last_flush_ms": 0.0,
+                        "max_flush_ms": 0.0,
+                        "total_flush_ms": 0.0,
+                    }
+
+        return cls._instance
+    
+    
+    # --- PRODUCERS ---
+    def _enqueue(self, op: tuple):
+        with self._pending_lock:
+            self._pending.append(op)
+            depth = len(self._pending)
+        self._ensure_running()
+        if depth >= config.WRITE_BEHIND_MAX_BATCH and self._wakeup is not None:
+            self._wakeup.set()
+    
+    
+    def ensure_chat(self, chat_id: str, title: str | None):
+        """Creates the chat at flush time, unless it already exists."""
+        self._enqueue(("chat", chat_id, title))
+    
+    
+    def touch(self, chat_id: str):
+        self._enqueue(("touch", chat_id, None))
+    
+    
+    def add_message(self, chat_id: str, role: str, content: str, tool_call_id: str | None = None, 
+                    tool_name: str | None = None, tool_calls: list | None = None):
+        self._enqueue(("message", chat_id, {"role": role, "content": content, "tool_call_id": tool_call_id,
+                                            "tool_name": tool_name, "tool_calls": tool_calls}))
+    
+    
+    def add_messages(self, chat_id: str, messages: list[dict]):
+        for message in messages:
+            self._enqueue(("message", chat_id, message))
+    
+    
+    # --- FLUSHER ---
+    def _ensure_running(self):
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # no event loop (scripts, shells): writes wait for an explicit flush()
+            return
+        self.start()
+    
+    
+    def start(self):
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=config.WRITE_BEHIND_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    
+    @staticmethod
+    def _apply(session, ops: list[tuple]):
+        new_chats = dict()
+        touched = set()
+        messages = list()
+        for kind, chat_id, payload in ops:
+            if kind == "chat":
+                new_chats.setdefault(chat_id, payload)
+            elif kind == "touch":
+                touched.add(chat_id)
+            else:
+                messages.append((chat_id, payload))
+        
+        if new_chats:
+            missing = ChatRepository.get_missing_ids(db_session=session, chat_ids=set(new_chats))
+            ChatRepository.create_many(db_session=session, 
+                                       chats={chat_id: new_chats[chat_id] for chat_id in new_chats if chat_id in missing},
+                                       commit=False)
+        # inserting in queue order (the unit of work keeps the add order per table)
+        for chat_id, message in messages:
+            MessageRepository.create_many(db_session=session, chat_id=chat_id, messages=[message], commit=False)
+        if touched:
+            session.flush()
+            ChatRepository.touch_many(db_session=session, chat_ids=touched, commit=False)
+    
+    
+    async def _write(self, ops: list[tuple]):
+        try:
+            await run_in_session(self._apply, ops)
+        except Exception as e:
+            # one bad op must not poison the whole batch: falling back to one transaction per op
+            print(f"!!! Group commit of {len(ops)} ops failed, retrying one by one: {str(e)}")
+            self._stats["failures"] += 1
+            for op in ops:
+                try:
+                    await run_in_session(self._apply, [op])
+                except Exception as op_error:
+                    self._stats["dropped_ops"] += 1
+                    print(f"!!! Dropping write-behind op {op[0]} for chat {op[1]}: {str(op_error)}")
+    
+    
+    async def flush(self):
+        """Applies everything queued so far in one transaction."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            with self._pending_lock:
+                ops = list(self._pending)
+                self._pending.clear()
+            if not ops:
+                return
+            
+            started = time.perf_counter()
+            await self._write(ops)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            
+            self._stats["flushes"] += 1
+            self._stats["flushed_ops"] += len(ops)
+            self._stats["last_flush_ms"] = round(elapsed_ms, 3)
+            self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], elapsed_ms), 3)
+            self._stats["total_flush_ms"] += elapsed_ms
+    
+    
+    async def stop(self):
+        """Stops the background flusher and flushes whatever is still queued."""
+        if self._task is not None:
+            # never cancelling the flusher: a cancelled group commit would roll back popped ops
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+    
+    
+    def stats(self) -> dict:
+        with self._pending_lock:
+            depth = len(self._pending)
+        stats = dict(self._stats)
+        total_flush_ms = stats.pop("total_flush_ms")
+        stats["avg_flush_ms"] = round(total_flush_ms / stats["flushes"], 3) if stats["flushes"] else 0.0
+        stats["queue_depth"] = depth
+        return stats
@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable
+import asyncio
+import time
+
+
+
+class Readiness:
+    """
+    Per-subsystem readiness and startup timing of the process.
+    Each subsystem is 'pending', 'ready' or 'failed'; only the `required` ones gate /readyz,
+    so plain chat is served while the heavy RAG subsystems are still warming up.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(Readiness, cls).__new__(cls)
+                    cls._instance._subsystems = dict()
+                    cls._instance.startup_timings = dict()
+
+        return cls._instance
+    
+    
+    def register(self, name: str, required: bool = False):
+        self._subsystems[name] = {"status": "pending", "required": required, "seconds": None, "error": None}
+    
+    
+    def _finish(self, name: str, started: float, error: Exception | None = None):
+        elapsed = round(time.perf_counter() - started, 3)
+        subsystem = self._subsystems.setdefault(name, {"required": False})
+        subsystem.update(status="failed" if error else "ready", seconds=elapsed, error=str(error) if error else None)
+        self.startup_timings[name] = elapsed
+        if error:
+            print(f"!!! Subsystem '{name}' failed to start: {str(error)}")
+    
+    
+    @contextmanager
+    def track(self, name: str):
+        """Times a synchronous startup step; a failure is recorded, not raised."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self._finish(name, started, e)
+        else:
+            self._finish(name, started)
+    
+    
+    async def run(self, name: str, fn: Callable[[], object]):
+        """Runs a blocking startup step on a worker thread and records its outcome."""
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(fn)
+        except Exception as e:
+            self._finish(name, started, e)
+        else:
+            self._finish(name, started)
+    
+    
+    @property
+    def is_ready(self) -> bool:
+        return all(s["status"] == "ready" for s in self._subsystems.values() if s["required"])
+    
+    
+    def report(self) -> dict:
+        return {
+            "ready": self.is_ready,
+            "subsystems": {name: dict(s) for name, s in self._subsystems.items()},
+            "startup_timings": dict(self.startup_timings)
+        }
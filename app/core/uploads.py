@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+from app.core import config
+import hashlib
+import asyncio
+import uuid
+import re
+import os
+
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+
+class InvalidUploadError(ValueError):
+    pass
+
+
+
+_CHAT_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+def is_valid_chat_id(chat_id: str | None) -> bool:
+    """chat ids name directories under UPLOAD_DIR, so only plain path-safe names are accepted"""
+    return bool(chat_id) and _CHAT_ID_PATTERN.fullmatch(chat_id) is not None
+
+
+def upload_filename(filename: str | None) -> str:
+    """The stored name of an upload: its basename, which must not be empty."""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        raise InvalidUploadError("File must have a name.")
+    return name
+
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Starlette spools a whole multipart body to disk before the endpoint runs, so the upload cap
+    is enforced here, before the body is read: by Content-Length up front, and by counting
+    the received bytes for requests without one. The allowance covers the other form fields.
+    """
+    def __init__(self, app, paths: set[str]):
+        self.app = app
+        self.paths = paths
+        self.limit = config.MAX_UPLOAD_BYTES + config.UPLOAD_FORM_OVERHEAD_BYTES
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            if not content_length.isdigit():
+                await JSONResponse({"detail": "Invalid Content-Length header."}, status_code=400)(scope, receive, send)
+                return
+            if int(content_length) > self.limit:
+                await self._reject(scope, receive, send)
+                return
+        
+        received = 0
+        exceeded = False
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    exceeded = True
+                    raise UploadTooLargeError()
+            return message
+        
+        async def guarded_send(message):
+            # the app answers an aborted body with its own error; the 413 below replaces it
+            if not exceeded:
+                await send(message)
+        
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLargeError:
+            pass
+        if exceeded:
+            await self._reject(scope, receive, send)
+
+
+    @staticmethod
+    async def _reject(scope, receive, send):
+        detail = f"File exceeds the {config.MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit."
+        await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+
+
+@dataclass
+class StoredUpload:
+    filename: str
+    file_path: str
+    size_bytes: int
+    sha256: str
+
+
+
+async def save_upload(file: UploadFile, chat_id: str) -> StoredUpload:
+    """
+    Streams an upload to disk in fixed-size chunks, hashing it on the fly.
+    Memory stays constant regardless of the file size, the size cap is enforced while reading,
+    and the file only appears under its final name (atomic rename) once it is complete.
+    """
+    if not is_valid_chat_id(chat_id):
+        raise InvalidUploadError("Invalid chat id.")
+    filename = upload_filename(file.filename)
+    chat_dir = os.path.join(config.UPLOAD_DIR, chat_id)
+    await asyncio.to_thread(os.makedirs, chat_dir, exist_ok=True)
+    
+    file_path = os.path.join(chat_dir, filename)
+    tmp_path = os.path.join(chat_dir, f".{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+    size = 0
+    
+    out = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while chunk := await file.read(config.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > config.MAX_UPLOAD_BYTES:
+                raise UploadTooLargeError(f"File exceeds the {config.MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit.")
+            hasher.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(os.replace, tmp_path, file_path)
+    except BaseException:
+        out.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    return StoredUpload(filename=filename, file_path=file_path, size_bytes=size, sha256=hasher.hexdigest())
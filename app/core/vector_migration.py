@@ -0,0 +1,171 @@
+"""
+Moves vectors into the chat-sharded content store, where each chat's vectors live in
+shard_name(chat_id) with `chat_id` as metadata:
+- legacy per-chat collections (`chat_{chat_id}`), whose documents are re-pointed at their chunks,
+- content-addressed vectors without a chat (earlier layout), copied to each chat whose documents use them,
+- vectors of a shard that is not their chat's (unsharded collection, previous VECTOR_SHARD_COUNT).
+Stored embeddings are copied as they are; nothing is re-embedded.
+
+Usage: python -m app.core.vector_migration [--keep-source]
+"""
+from app.core.vector_store import VectorStoreRegistry, shard_name, shard_names, vector_id
+from app.core.vector_service import chunk_hash
+from app.core.persistence.db import init_db
+from app.core.persistence.db_sessions import get_session
+from app.core.persistence.repositories import DocumentRepository
+from app.core import config
+import argparse
+import hashlib
+import os
+
+
+MIGRATION_BATCH_SIZE = 500
+
+
+
+def _file_hash(file_path: str) -> str | None:
+    if not os.path.exists(file_path):
+        return None
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for piece in iter(lambda: file.read(config.UPLOAD_CHUNK_SIZE), b""):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def _chunk_owners() -> dict[str, list[str]]:
+    """chunk id -> chats whose content-addressed documents (earlier layout) use the chunk"""
+    owners = dict()
+    with get_session() as session:
+        for document in DocumentRepository.get_by_collection_name(db_session=session, collection_name=config.CONTENT_COLLECTION):
+            for chunk_id in document.chunk_hashes or []:
+                chats = owners.setdefault(chunk_id, [])
+                if document.chat_id not in chats:
+                    chats.append(document.chat_id)
+    return owners
+
+
+def _targets(collection_name: str, row_id: str, text: str, metadata: dict | None,
+             owners: dict[str, list[str]]) -> list[tuple[str, str, str]]:
+    """(shard, vector id, chat id) of every chat the row belongs to"""
+    if collection_name.startswith("chat_"):
+        chat_id = collection_name[len("chat_"):]
+        return [(shard_name(chat_id), vector_id(chat_id, chunk_hash(text)), chat_id)]
+    chat_id = (metadata or {}).get("chat_id")
+    if chat_id is not None:
+        return [(shard_name(chat_id), row_id, chat_id)]
+    # content-addressed: the row id is the chunk id, shared by the chats using it
+    return [(shard_name(owner), vector_id(owner, row_id), owner) for owner in owners.get(row_id, [])]
+
+
+def _move_collection(registry: VectorStoreRegistry, collection_name: str,
+                     owners: dict[str, list[str]]) -> dict[str | None, list[str]]:
+    """
+    Copies the misplaced vectors of a collection into their chats' shards and returns the
+    chunk ids of the collection in order, grouped by the source file of the chunks.
+    """
+    source = registry.get_collection(collection_name)._collection
+    is_current_shard = collection_name in shard_names()
+    chunks_by_file = dict()
+    misplaced_ids = []
+
+    offset = 0
+    while True:
+        rows = source.get(include=["embeddings", "documents", "metadatas"],
+                          limit=MIGRATION_BATCH_SIZE, offset=offset)
+        if not rows["ids"]:
+            break
+        offset += len(rows["ids"])
+
+        moves = dict()
+        for row_id, embedding, text, metadata in zip(rows["ids"], rows["embeddings"], rows["documents"], rows["metadatas"]):
+            chunks_by_file.setdefault((metadata or {}).get("source"), []).append(chunk_hash(text))
+            targets = _targets(collection_name, row_id, text, metadata, owners)
+            if targets == [(collection_name, row_id, (metadata or {}).get("chat_id"))]:
+                continue
+            # rows in the wrong place, and chat-less rows no document uses any more, leave the shard
+            if is_current_shard:
+                misplaced_ids.append(row_id)
+            for target, target_id, chat_id in targets:
+                moves.setdefault(target, dict())[target_id] = (embedding, text, {**(metadata or {}), "chat_id": chat_id})
+
+        for target, vectors in moves.items():
+            registry.get_collection(target)._collection.upsert(
+                ids=list(vectors),
+                embeddings=[embedding for embedding, _, _ in vectors.values()],
+                documents=[text for _, text, _ in vectors.values()],
+                metadatas=[metadata for _, _, metadata in vectors.values()])
+
+    if misplaced_ids:
+        source.delete(ids=misplaced_ids)
+    return {source_file: list(dict.fromkeys(chunk_ids)) for source_file, chunk_ids in chunks_by_file.items()}
+
+
+def _reindex_documents(collection_name: str, chunks_by_file: dict[str | None, list[str]]) -> int:
+    """Points the documents of a legacy per-chat collection at their chunks in the chat's shard"""
+    all_chunks = list(dict.fromkeys(chunk_id for chunk_ids in chunks_by_file.values() for chunk_id in chunk_ids))
+    with get_session() as session:
+        documents = [(document.id, document.chat_id, document.file_path)
+                     for document in DocumentRepository.get_by_collection_name(db_session=session, collection_name=collection_name)]
+        for document_id, chat_id, file_path in documents:
+            # loaders record the file path as `source`; a chunk of unknown origin means the whole collection
+            chunk_ids = chunks_by_file.get(file_path, all_chunks)
+            DocumentRepository.set_content_index(db_session=session,
+                                                 document_id=document_id,
+                                                 collection_name=shard_name(chat_id),
+                                                 chunk_hashes=chunk_ids,
+                                                 file_hash=_file_hash(file_path))
+    return len(documents)
+
+
+def _repoint_content_documents(collection_names: list[str]) -> int:
+    """Points the documents of the migrated content collections at their chat's current shard"""
+    updated = 0
+    with get_session() as session:
+        documents = [(document.id, document.chat_id, document.collection_name, document.chunk_hashes, document.file_hash)
+                     for document in DocumentRepository.get_by_collection_names(db_session=session, collection_names=collection_names)]
+        for document_id, chat_id, collection_name, chunk_ids, file_hash in documents:
+            if collection_name == shard_name(chat_id):
+                continue
+            DocumentRepository.set_content_index(db_session=session,
+                                                 document_id=document_id,
+                                                 collection_name=shard_name(chat_id),
+                                                 chunk_hashes=chunk_ids or [],
+                                                 file_hash=file_hash)
+            updated += 1
+    return updated
+
+
+def migrate_vector_store(keep_source: bool = False) -> dict:
+    init_db()
+    registry = VectorStoreRegistry()
+    current_shards = shard_names()
+    owners = _chunk_owners()
+    report = {"collections": 0, "documents_updated": 0}
+    content_collections = [config.CONTENT_COLLECTION]
+
+    for collection in registry.get_client().list_collections():
+        name = collection.name
+        if not (name.startswith("chat_") or name.startswith(config.CONTENT_COLLECTION)):
+            continue
+
+        chunks_by_file = _move_collection(registry, name, owners)
+        if name.startswith("chat_"):
+            report["documents_updated"] += _reindex_documents(name, chunks_by_file)
+        else:
+            content_collections.append(name)
+        if name not in current_shards and not keep_source:
+            registry.drop_collection(name)
+        report["collections"] += 1
+        print(f"Migrated collection {name}")
+
+    report["documents_updated"] += _repoint_content_documents(content_collections)
+    return report
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Moves vectors into the chat-sharded content store.")
+    parser.add_argument("--keep-source", action="store_true", help="keep the migrated collections instead of deleting them")
+    args = parser.parse_args()
+    print(migrate_vector_store(keep_source=args.keep_source))
@@ -1,53 +1,101 @@
-from langchain_community.document_loaders import PyPDFLoader,TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+from app.core.vector_store import VectorStoreRegistry, shard_name, vector_id
+import hashlib
 import os
 
 
 
+def chunk_hash(text: str) -> str:
+    """Content address of a chunk; a chat's vector of it is stored as vector_id(chat_id, chunk_hash)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+
+def count_pages(file_path: str) -> int:
+    """Number of pages a document is parsed in: the PDF's pages, a single one for text and CSV files."""
+    if file_path.endswith('.pdf'):
+        from pypdf import PdfReader
+        return len(PdfReader(file_path).pages)
+    elif file_path.endswith(('.txt', '.csv')):
+        return 1
+    raise ValueError(f"Unsupported file type: {os.path.basename(file_path)}")
+
+
+
+def load_and_split(file_path: str, start_page: int, end_page: int, 
+                   chunk_size: int, chunk_overlap: int) -> tuple[int, list[tuple[str, dict]]]:
+    """
+    Parses the pages [start_page, end_page) of a document and splits them into chunks,
+    returning (pages parsed, [(text, metadata)]). Pages are split one by one, so
+    parsing a document range by range yields the same chunks as parsing it whole.
+    CPU-bound and free of shared state, so ingestion jobs run it on a process pool.
+    """
+    # heavy imports (pypdf, splitters), deferred so that plain chat never pays for them
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    
+    # transforming into documents object
+    if file_path.endswith('.pdf'):
+        from pypdf import PdfReader
+        reader = PdfReader(file_path)
+        total_pages = len(reader.pages)
+        pages = [Document(page_content=reader.pages[page].extract_text(),
+                          metadata={"source": file_path, "page": page, "total_pages": total_pages})
+                 for page in range(start_page, min(end_page, total_pages))]
+    elif file_path.endswith(('.txt', '.csv')):
+        from langchain_community.document_loaders import TextLoader
+        pages = TextLoader(file_path).load() if start_page == 0 else []
+    else:
+        raise ValueError(f"Unsupported file type: {os.path.basename(file_path)}")
+    
+    # making chunk of the documents
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = text_splitter.split_documents(pages)
+    return len(pages), [(chunk.page_content, chunk.metadata) for chunk in chunks]
+
+
+
 class VectorService:
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        self.persist_directory = './chroma_db'
-        self.base_upload_dir = './uploads'
+        self.vector_stores = VectorStoreRegistry()
         
     
-    async def ingest_file(self, file_content: bytes, filename: str, chat_id: str) -> str:
-        chat_sir = os.path.join(self.base_upload_dir, chat_id)
-        
-        # creating the chat directory
-        if not os.path.exists(chat_sir):
-            os.makedirs(chat_sir, exist_ok=True)
-        
-        # writing the file
-        file_path = os.path.join(chat_sir, filename)
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-        
-        # transforming into documents object
-        if filename.endswith('.pdf'):
-            loader = PyPDFLoader(file_path)
-        elif filename.endswith('.txt'):
-            loader = TextLoader(file_path)
-        else:
-            # TODO: need to handle this
-            raise ValueError(f"Unsupported file type: {filename}")
-        
-        document = loader.load()
-        
-        # making chunk of the documents
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = text_splitter.split_documents(document)
+    def upsert_chunks(self, chat_id: str, chunks: dict[str, tuple[str, dict]]) -> int:
+        """
+        Adds a batch of {chunk id: (text, metadata)} to the chat's shard, each vector tagged with
+        the chat_id that retrieval filters on. Chunks the chat already has are skipped, and chunks
+        known from other chats get their vectors from the embedding cache. Returns the number skipped.
+        """
+        vector_db = self.vector_stores.get_collection(shard_name(chat_id))
+        ids = {vector_id(chat_id, chunk_id): chunk_id for chunk_id in chunks}
+        stored_ids = set(vector_db.get(ids=list(ids), include=[])["ids"])
+        new_ids = [row_id for row_id in ids if row_id not in stored_ids]
         
         # vectorizing and saving into chromadb
-        Chroma.from_documents(documents=chunks,
-                              embedding=self.embeddings,
-                              persist_directory=self.persist_directory,
-                              collection_name=f'chat_{chat_id}')
-        
-        return file_path
-        
-        
-        
-        
+        if new_ids:
+            vector_db.add_texts(texts=[chunks[ids[row_id]][0] for row_id in new_ids], 
+                                metadatas=[{**chunks[ids[row_id]][1], "chat_id": chat_id} for row_id in new_ids],
+                                ids=new_ids)
+        return len(ids) - len(new_ids)
+    
+    
+    def copy_chunks(self, source_collection: str, source_chat_id: str, chat_id: str, chunk_ids: list[str]) -> int:
+        """
+        Copies the stored vectors of another chat's chunks into this chat's shard, without embedding
+        them again. Returns the number of chunks copied (fewer when the source is incomplete).
+        """
+        source = self.vector_stores.get_collection(source_collection)._collection
+        target = self.vector_stores.get_collection(shard_name(chat_id))._collection
+        copied = 0
+        # staying well under SQLite's bound-parameter limit
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            rows = source.get(ids=[vector_id(source_chat_id, chunk_id) for chunk_id in batch],
+                              include=["embeddings", "documents", "metadatas"])
+            if not rows["ids"]:
+                continue
+            target.upsert(ids=[vector_id(chat_id, row_id.split(":", 1)[1]) for row_id in rows["ids"]],
+                          embeddings=rows["embeddings"],
+                          documents=rows["documents"],
+                          metadatas=[{**(metadata or {}), "chat_id": chat_id} for metadata in rows["metadatas"]])
+            copied += len(rows["ids"])
+        return copied
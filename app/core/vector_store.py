@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from app.core.embeddings import EmbeddingService
+from app.core import config
+from threading import Lock
+import hashlib
+
+
+
+def shard_name(chat_id: str) -> str:
+    """The content shard holding all the vectors of a chat, picked by a hash of the chat id"""
+    digest = hashlib.sha256(chat_id.encode("utf-8")).hexdigest()
+    return f"{config.CONTENT_COLLECTION}_{int(digest[:8], 16) % config.VECTOR_SHARD_COUNT:02d}"
+
+
+def shard_names() -> list[str]:
+    return [f"{config.CONTENT_COLLECTION}_{shard:02d}" for shard in range(config.VECTOR_SHARD_COUNT)]
+
+
+def vector_id(chat_id: str, chunk_id: str) -> str:
+    """The id of a chat's copy of a chunk; the chunk id is the hash of its text"""
+    return f"{chat_id}:{chunk_id}"
+
+
+
+class VectorStoreRegistry:
+    """
+    The one Chroma PersistentClient of the process and an LRU of open collection handles,
+    shared by ingestion and retrieval, so a lookup never reopens the SQLite/HNSW persistence.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(VectorStoreRegistry, cls).__new__(cls)
+                    cls._instance._client = None
+                    cls._instance._handles = OrderedDict()
+                    cls._instance._build_lock = Lock()
+                    cls._instance.hits = 0
+                    cls._instance.misses = 0
+
+        return cls._instance
+
+
+    def get_client(self):
+        if self._client is None:
+            with self._build_lock:
+                if self._client is None:
+                    # chromadb is imported on first use, not at server startup
+                    import chromadb
+                    self._client = chromadb.PersistentClient(path=config.CHROMA_PERSIST_DIR)
+        return self._client
+
+
+    def get_collection(self, collection_name: str):
+        """Returns the cached langchain Chroma handle of a collection, opening it on a miss."""
+        client = self.get_client()
+        with self._build_lock:
+            handle = self._handles.get(collection_name)
+            if handle is not None:
+                self._handles.move_to_end(collection_name)
+                self.hits += 1
+                return handle
+            
+            from langchain_chroma import Chroma
+            self.misses += 1
+            handle = Chroma(client=client,
+                            embedding_function=EmbeddingService(),
+                            collection_name=collection_name)
+            self._handles[collection_name] = handle
+            while len(self._handles) > config.VECTOR_HANDLE_CACHE_SIZE:
+                self._handles.popitem(last=False)
+        return handle
+
+
+    def drop_collection(self, collection_name: str):
+        """Deletes a collection and its cached handle."""
+        client = self.get_client()
+        with self._build_lock:
+            self._handles.pop(collection_name, None)
+            client.delete_collection(name=collection_name)
+
+
+    def warm_up(self):
+        """Imports langchain_chroma and opens the client, so the first lookup pays for neither."""
+        import langchain_chroma  # noqa: F401
+        self.get_client()
+
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "client_open": self._client is not None,
+            "open_collections": len(self._handles),
+            "capacity": config.VECTOR_HANDLE_CACHE_SIZE,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -1,16 +1,66 @@
+import time
+_BOOT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import chat_endpoints
+from app.api import chat_endpoints, system_endpoints
+from app.core.uploads import UploadSizeLimitMiddleware
 from contextlib import asynccontextmanager
+import asyncio
+
 
 
+async def _warm_up_rag_subsystems():
+    """Heavy RAG subsystems are imported and loaded in the background, never on the boot path."""
+    from app.core import config
+    from app.core.embeddings import EmbeddingService
+    from app.core.vector_store import VectorStoreRegistry
+    from app.core.readiness import Readiness
+    readiness = Readiness()
+    
+    await readiness.run("vector_store", VectorStoreRegistry().warm_up)
+    if config.EMBEDDING_WARMUP:
+        await readiness.run("embeddings", EmbeddingService().warm_up)
+    
+
 
 # app startup events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     from app.core.persistence import db
-    db.init_db()
+    from app.agents import agents
+    from app.agents.llm_registry import LLMRegistry
+    from app.core.persistence.write_behind import WriteBehindQueue
+    from app.core.readiness import Readiness
+    from app.core.ingestion import IngestionManager
+    from app.core.embedding_cache import EmbeddingCache
+    readiness = Readiness()
+    readiness.startup_timings["imports"] = round(time.perf_counter() - _BOOT_STARTED, 3)
+    for name, required in (("database", True), ("llm", True), ("vector_store", False), ("embeddings", False)):
+        readiness.register(name, required=required)
+    
+    with readiness.track("database"):
+        db.init_db()
+        WriteBehindQueue().start()
+    IngestionManager().start()
+    
+    # pre-building the LLM clients; a missing API key must not block the startup
+    with readiness.track("llm"):
+        agents.warm_up()
+    
+    warm_up_task = asyncio.create_task(_warm_up_rag_subsystems())
+    readiness.startup_timings["boot_to_serving"] = round(time.perf_counter() - _BOOT_STARTED, 3)
+    
     yield
+    
+    if not warm_up_task.done():
+        warm_up_task.cancel()
+    await IngestionManager().stop()
+    # flushing the queued chat writes before the worker exits
+    await WriteBehindQueue().stop()
+    await LLMRegistry().aclose()
+    await db.dispose_engines()
+    EmbeddingCache().close()
 
 
 
@@ -21,7 +71,11 @@ app = FastAPI(title='Synapse', lifespan=lifespan)
 
 # including the chat router
 app.include_router(chat_endpoints.router)
+app.include_router(system_endpoints.router)
+
 
+# refusing oversized uploads before their body is spooled to disk (inside CORS, so the 413 keeps its headers)
+app.add_middleware(UploadSizeLimitMiddleware, paths={"/upload", "/upload-and-query"})
 
 # adding the CORS middleware
 app.add_middleware(
@@ -0,0 +1,194 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+from app.core import config
+import asyncio
+import json
+import time
+
+
+
+class ToolResultCache:
+    """
+    Process-wide, bounded LRU cache of tool results.
+    Every tool declares its own TTL in `config.TOOL_CACHE_TTLS`:
+    None caches forever, 0 (or a missing entry) never caches.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(ToolResultCache, cls).__new__(cls)
+                    cls._instance._entries = OrderedDict()
+                    cls._instance._inflight = dict()
+                    cls._instance._entries_lock = Lock()
+                    cls._instance.max_entries = config.TOOL_CACHE_MAX_ENTRIES
+                    cls._instance._counters = dict()
+
+        return cls._instance
+    
+    
+    @staticmethod
+    def _normalize(value: Any, case_insensitive: bool) -> Any:
+        if isinstance(value, str):
+            value = value.strip()
+            return value.casefold() if case_insensitive else value
+        if isinstance(value, dict):
+            return {k: ToolResultCache._normalize(v, case_insensitive) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [ToolResultCache._normalize(v, case_insensitive) for v in value]
+        return value
+    
+    
+    def make_key(self, tool_name: str, tool_args: dict) -> tuple[str, str]:
+        """Normalized tool name + canonical JSON of the args (`chat_id` included when present)."""
+        tool_name = tool_name.strip()
+        case_insensitive = tool_name in config.TOOL_CACHE_CASE_INSENSITIVE
+        args = self._normalize(tool_args, case_insensitive)
+        return tool_name, json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+    
+    
+    def _count(self, tool_name: str, counter: str):
+        counters = self._counters.setdefault(tool_name, {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0})
+        counters[counter] += 1
+    
+    
+    def get(self, key: tuple[str, str]) -> tuple[bool, Any]:
+        with self._entries_lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._count(key[0], "expirations")
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+    
+    
+    def put(self, key: tuple[str, str], value: Any, ttl: float | None):
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._entries_lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._count(evicted_key[0], "evictions")
+    
+    
+    def invalidate(self, tool_name: str | None = None, chat_id: str | None = None):
+        """Drops the entries of a tool and/or of a chat (e.g. after a new upload)."""
+        chat_marker = None if chat_id is None else json.dumps(chat_id, ensure_ascii=False)
+        with self._entries_lock:
+            for key in list(self._entries):
+                if tool_name is not None and key[0] != tool_name:
+                    continue
+                if chat_marker is not None and f'"chat_id": {chat_marker}' not in key[1]:
+                    continue
+                del self._entries[key]
+    
+    
+    def clear(self):
+        with self._entries_lock:
+            self._entries = OrderedDict()
+    
+    
+    def stats(self) -> dict:
+        with self._entries_lock:
+            per_tool = {name: dict(counters) for name, counters in self._counters.items()}
+            size = len(self._entries)
+        hits = sum(c["hits"] + c["coalesced"] for c in per_tool.values())
+        misses = sum(c["misses"] for c in per_tool.values())
+        return {
+            "entries": size,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "tools": per_tool
+        }
+
+
+
+class CachedTool:
+    """Wraps a LangChain tool, serving repeated invocations from `ToolResultCache`."""
+    
+    def __init__(self, tool):
+        self.tool = tool
+        self.name = tool.name
+        self.cache = ToolResultCache()
+    
+    
+    @property
+    def ttl(self) -> float | None:
+        return config.TOOL_CACHE_TTLS.get(self.name, 0)
+    
+    
+    @staticmethod
+    def _is_cacheable(result: Any) -> bool:
+        # failed calls are never cached, so a transient error is retried next time
+        return not (isinstance(result, dict) and result.get('ok') is False)
+    
+    
+    def invoke(self, tool_args: dict) -> Any:
+        ttl = self.ttl
+        if ttl == 0:
+            return self.tool.invoke(tool_args)
+
+        key = self.cache.make_key(self.name, tool_args)
+        found, value = self.cache.get(key)
+        if found:
+            self.cache._count(self.name, "hits")
+            return value
+        
+        self.cache._count(self.name, "misses")
+        result = self.tool.invoke(tool_args)
+        if self._is_cacheable(result):
+            self.cache.put(key, result, ttl)
+        return result
+    
+    
+    async def ainvoke(self, tool_args: dict) -> Any:
+        ttl = self.ttl
+        if ttl == 0:
+            return await self.tool.ainvoke(tool_args)
+        
+        key = self.cache.make_key(self.name, tool_args)
+        found, value = self.cache.get(key)
+        if found:
+            self.cache._count(self.name, "hits")
+            return value
+        
+        # coalescing: concurrent identical calls share one execution
+        task = self.cache._inflight.get(key)
+        if task is not None:
+            self.cache._count(self.name, "coalesced")
+        else:
+            self.cache._count(self.name, "misses")
+            task = asyncio.create_task(self._execute(key, tool_args, ttl))
+            self.cache._inflight[key] = task
+            task.add_done_callback(self._finish)
+        # the execution is a task of its own: a caller timing out or being cancelled stops
+        # waiting for it, while the other callers still get the result
+        return await asyncio.shield(task)
+
+
+    async def _execute(self, key: tuple[str, str], tool_args: dict, ttl: float | None) -> Any:
+        try:
+            result = await self.tool.ainvoke(tool_args)
+            if self._is_cacheable(result):
+                self.cache.put(key, result, ttl)
+            return result
+        finally:
+            self.cache._inflight.pop(key, None)
+
+
+    @staticmethod
+    def _finish(task: asyncio.Task):
+        # marking the exception retrieved when every caller has stopped waiting
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,240 @@
+from app.core import config
+from functools import lru_cache
+import numpy as np
+import operator
+import math
+import ast
+
+
+
+class ExpressionError(ValueError):
+    """Raised for expressions that are invalid, unsupported or over the cost limit."""
+
+
+
+Value = int | float | np.ndarray
+
+
+def _log(value: Value, base: Value | None = None) -> Value:
+    if isinstance(value, np.ndarray) or isinstance(base, np.ndarray):
+        return np.log(value) if base is None else np.log(value) / np.log(base)
+    if value <= 0 or (base is not None and base <= 0):
+        raise ExpressionError("Logarithm arguments must be positive.")
+    return math.log(value) if base is None else math.log(value, base)
+
+
+def _sqrt(value: Value) -> Value:
+    if isinstance(value, np.ndarray):
+        return np.sqrt(value)
+    if value < 0:
+        raise ExpressionError("Cannot compute square root of negative number.")
+    return math.sqrt(value)
+
+
+def _factorial(value: Value) -> int:
+    if isinstance(value, np.ndarray) or value != int(value) or value < 0:
+        raise ExpressionError("factorial() needs a non-negative whole number.")
+    if value > config.EXPRESSION_MAX_FACTORIAL:
+        raise ExpressionError(f"factorial() is limited to {config.EXPRESSION_MAX_FACTORIAL}.")
+    return math.factorial(int(value))
+
+
+def _unary(scalar_fn, array_fn):
+    return lambda value: array_fn(value) if isinstance(value, np.ndarray) else scalar_fn(value)
+
+
+def _aggregate(scalar_fn, array_fn):
+    # min(a, b, ...) over scalars, or min(array) over the elements of an array
+    def aggregate(*values):
+        if len(values) == 1 and isinstance(values[0], np.ndarray):
+            return array_fn(values[0]).item()
+        if any(isinstance(value, np.ndarray) for value in values):
+            raise ExpressionError("Aggregates take either one array or several numbers.")
+        return scalar_fn(values)
+    return aggregate
+
+
+FUNCTIONS = {
+    "sqrt": _sqrt,
+    "cbrt": _unary(lambda x: math.copysign(abs(x) ** (1 / 3), x), np.cbrt),
+    "exp": _unary(math.exp, np.exp),
+    "log": _log,
+    "ln": _log,
+    "log10": _unary(lambda x: _log(x, 10), np.log10),
+    "log2": _unary(lambda x: _log(x, 2), np.log2),
+    "sin": _unary(math.sin, np.sin),
+    "cos": _unary(math.cos, np.cos),
+    "tan": _unary(math.tan, np.tan),
+    "asin": _unary(math.asin, np.arcsin),
+    "acos": _unary(math.acos, np.arccos),
+    "atan": _unary(math.atan, np.arctan),
+    "atan2": lambda y, x: np.arctan2(y, x) if isinstance(y, np.ndarray) or isinstance(x, np.ndarray) else math.atan2(y, x),
+    "sinh": _unary(math.sinh, np.sinh),
+    "cosh": _unary(math.cosh, np.cosh),
+    "tanh": _unary(math.tanh, np.tanh),
+    "degrees": _unary(math.degrees, np.degrees),
+    "radians": _unary(math.radians, np.radians),
+    "abs": _unary(abs, np.abs),
+    "floor": _unary(math.floor, np.floor),
+    "ceil": _unary(math.ceil, np.ceil),
+    "round": lambda value, digits=0: np.round(value, int(digits)) if isinstance(value, np.ndarray) else round(value, int(digits)),
+    "hypot": lambda *values: np.hypot(*values) if len(values) == 2 else math.hypot(*values),
+    "factorial": _factorial,
+    "min": _aggregate(min, np.min),
+    "max": _aggregate(max, np.max),
+    "sum": _aggregate(sum, np.sum),
+    "mean": _aggregate(lambda values: sum(values) / len(values), np.mean),
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+
+def _power(base: Value, exponent: Value) -> Value:
+    # exact integer powers grow without bound: 9 ** 9 ** 9 would run for minutes
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        if abs(base) > 1 and base.bit_length() * exponent > config.EXPRESSION_MAX_INT_BITS:
+            raise ExpressionError("Result is too large for an exact integer power.")
+    result = operator.pow(base, exponent)
+    # a negative base to a fractional power, e.g. (-8) ^ (1/3)
+    if isinstance(result, complex):
+        raise ExpressionError("Result is not a real number.")
+    return result
+
+
+def _divide(op):
+    def divide(left: Value, right: Value) -> Value:
+        if not isinstance(right, np.ndarray) and right == 0:
+            raise ExpressionError("Division by zero is not allowed.")
+        return op(left, right)
+    return divide
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: _divide(operator.truediv),
+    ast.FloorDiv: _divide(operator.floordiv),
+    ast.Mod: _divide(operator.mod),
+    ast.Pow: _power,
+}
+
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+
+@lru_cache(maxsize=256)
+def _parse(expression: str) -> ast.expr:
+    """Parses and validates an expression once; evaluation then walks the cached tree."""
+    if len(expression) > config.EXPRESSION_MAX_LENGTH:
+        raise ExpressionError(f"Expression is longer than {config.EXPRESSION_MAX_LENGTH} characters.")
+    try:
+        # ^ is read as a power, the way people write formulas (with the precedence of **)
+        tree = ast.parse(expression.strip().replace("^", "**"), mode="eval").body
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}") from None
+
+    nodes = 0
+    for node in ast.walk(tree):
+        nodes += 1
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                raise ExpressionError(f"Unknown function: {ast.unparse(node.func)}")
+            if node.keywords:
+                raise ExpressionError("Functions take positional arguments only.")
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f"Unsupported literal: {node.value!r}")
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in BINARY_OPERATORS:
+                raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in UNARY_OPERATORS:
+                raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        elif not isinstance(node, (ast.Name, ast.Load, ast.operator, ast.unaryop)):
+            raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+    if nodes > config.EXPRESSION_MAX_NODES:
+        raise ExpressionError(f"Expression has more than {config.EXPRESSION_MAX_NODES} elements.")
+    return tree
+
+
+
+class _Evaluator:
+    def __init__(self, variables: dict[str, Value]):
+        self.variables = variables
+        self.cost = 0
+
+
+    def _charge(self, value: Value) -> Value:
+        # every produced value costs its element count; arrays make the bound matter
+        self.cost += value.size if isinstance(value, np.ndarray) else 1
+        if self.cost > config.EXPRESSION_MAX_COST:
+            raise ExpressionError("Expression is too expensive to evaluate.")
+        if isinstance(value, complex):
+            raise ExpressionError("Result is not a real number.")
+        # any exact integer, not only powers: factorial(1000) * factorial(1000) must stay printable
+        if isinstance(value, int) and value.bit_length() > config.EXPRESSION_MAX_INT_BITS:
+            raise ExpressionError("Result is too large.")
+        return value
+
+
+    def eval(self, node: ast.expr) -> Value:
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id in self.variables:
+                return self.variables[node.id]
+            if node.id in CONSTANTS:
+                return CONSTANTS[node.id]
+            raise ExpressionError(f"Unknown variable: {node.id}")
+        if isinstance(node, ast.BinOp):
+            left, right = self.eval(node.left), self.eval(node.right)
+            return self._charge(BINARY_OPERATORS[type(node.op)](left, right))
+        if isinstance(node, ast.UnaryOp):
+            return self._charge(UNARY_OPERATORS[type(node.op)](self.eval(node.operand)))
+        # ast.Call, validated by _parse
+        args = [self.eval(arg) for arg in node.args]
+        return self._charge(FUNCTIONS[node.func.id](*args))
+
+
+
+def evaluate(expression: str, variables: dict | None = None) -> int | float | list:
+    """
+    Evaluates an arithmetic expression without eval(): numbers, + - * / // % ** (or ^),
+    FUNCTIONS, CONSTANTS and variables. Variables given as lists are NumPy arrays and
+    the expression is evaluated element-wise over them. Raises ExpressionError.
+    """
+    tree = _parse(expression)
+
+    values = dict()
+    for name, value in (variables or {}).items():
+        if not name.isidentifier():
+            raise ExpressionError(f"Invalid variable name: {name}")
+        if isinstance(value, (list, tuple)):
+            if len(value) > config.EXPRESSION_MAX_ARRAY_SIZE:
+                raise ExpressionError(f"Variable '{name}' has more than {config.EXPRESSION_MAX_ARRAY_SIZE} values.")
+            value = np.asarray(value, dtype=float)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ExpressionError(f"Variable '{name}' must be a number or a list of numbers.")
+        values[name] = value
+
+    try:
+        with np.errstate(all="ignore"):
+            result = _Evaluator(values).eval(tree)
+    except ExpressionError:
+        raise
+    except OverflowError:
+        raise ExpressionError("Result is too large.") from None
+    except (ZeroDivisionError, ValueError) as e:
+        raise ExpressionError(str(e)) from None
+    except TypeError as e:
+        raise ExpressionError(f"Invalid arguments: {e}") from None
+
+    # inf and nan are not numbers the model can use (nor valid JSON); exact integers are always finite
+    if not isinstance(result, int) and not np.isfinite(result).all():
+        raise ExpressionError("Result is not a finite number.")
+    if isinstance(result, np.ndarray):
+        return result.tolist()
+    if isinstance(result, np.generic):
+        return result.item()
+    return result
@@ -1,8 +1,10 @@
 from pydantic import BaseModel, Field
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
 from langchain.tools import tool
-import os
+from app.core.embeddings import EmbeddingService
+from app.core.vector_store import VectorStoreRegistry
+from app.core.persistence.db_sessions import get_session
+from app.core.persistence.repositories import DocumentRepository
+from app.core import config
 
 
 class KnowledgeBaseInput(BaseModel):
@@ -11,7 +13,38 @@ class KnowledgeBaseInput(BaseModel):
     class Config:
         extra = 'allow'
 
-EMBEDDINGS = HuggingFaceEmbeddings(model_name='all-MiniLM-L6-v2')
+
+
+def search_chat_documents(chat_id: str, query: str, k: int = 3) -> list[tuple[str, float]] | None:
+    """
+    The k chunks of the chat's documents closest to the query, as (text, relevance) with the most
+    relevant first, or None when the chat has no documents. Relevance is 1 - distance / 2,
+    the cosine similarity for the normalized embeddings and squared-L2 collections used here.
+    """
+    with get_session() as session:
+        collection_names = DocumentRepository.get_collection_names(db_session=session, chat_id=chat_id)
+    
+    if not collection_names:
+        return None
+    
+    vector_stores = VectorStoreRegistry()
+    query_vector = EmbeddingService().embed_query(query)
+    
+    scored_docs = []
+    for collection_name in collection_names:
+        vectod_db = vector_stores.get_collection(collection_name)
+        # a shard is shared by many chats: one search, filtered to this chat's vectors
+        if collection_name.startswith(f"{config.CONTENT_COLLECTION}_"):
+            scored_docs += vectod_db.similarity_search_by_vector_with_relevance_scores(query_vector, k=k, 
+                                                                                      filter={"chat_id": chat_id})
+        # legacy per-chat collections, until the migration moves them
+        elif collection_name.startswith("chat_"):
+            scored_docs += vectod_db.similarity_search_by_vector_with_relevance_scores(query_vector, k=k)
+    
+    # lowest distance first
+    scored_docs = sorted(scored_docs, key=lambda pair: pair[1])[:k]
+    return [(doc.page_content, 1 - distance / 2) for doc, distance in scored_docs]
+
 
 
 @tool('query_knowledge_base', args_schema=KnowledgeBaseInput)
@@ -21,21 +54,12 @@ def query_knowledge_base(query: str, chat_id: str):
     to questions based on specific local knowledge. Use this tool whenever the user 
     asks about content they have uploaded.
     """
-    persist_dir = './chroma_db'
-    collection_name = f'chat_{chat_id}'
+    results = search_chat_documents(chat_id=chat_id, query=query, k=3)
     
-    if not os.path.exists(persist_dir) or not os.listdir(persist_dir):
+    if results is None:
         return "No knowledge base found"
-    
-    vectod_db = Chroma(persist_directory=persist_dir, 
-                embedding_function=EMBEDDINGS, 
-                collection_name=collection_name)
-    
-    docs = vectod_db.similarity_search(query, k=3)
-    if not docs:
+    if not results:
         return " No relevant information found"
     
-    context = "\n---\n".join([doc.page_content for doc in docs])
+    context = "\n---\n".join([text for text, _ in results])
     return f"Information found in uploaded documents:\n\n{context}"
-
-    
\ No newline at end of file
@@ -1,8 +1,15 @@
+from pydantic import BaseModel, Field
 from langchain.tools import tool
-from collections import Counter
-from typing import Literal, List, Union
+from app.tools.expression_engine import evaluate, ExpressionError
+from app.core import config
+from app.core.uploads import is_valid_chat_id
+from typing import Literal, List, Dict, Union, Optional, Iterator
+from array import array
 import numpy as np
+import itertools
 import math
+import csv
+import os
 
 
 
@@ -18,6 +25,7 @@ def scientific_calculator(
     Perform arithmetic or scientific calculations. 
     Use for: powers, roots, trig (sin/cos/tan), logs, or basic math.
     'operands' is a list: [val1, val2] for binary ops, [val] for unary (sqrt/sin/cos/tan/log).
+    For a formula with several steps, use evaluate_expression instead, in a single call.
     """
     try:
         if not operands:
@@ -94,68 +102,199 @@ def scientific_calculator(
 
 
 
-@tool('calculate_statistics')
-def calculate_statistics(numbers: list) -> dict:
+@tool('evaluate_expression')
+def evaluate_expression(expression: str, variables: Optional[Dict[str, Union[Number, List[Number]]]] = None) -> dict:
+    """
+    Evaluate a whole math formula in one call, e.g. 'P * (1 + r/n)^(n*t)' or 'sqrt(a^2 + b^2) / log(c)'.
+    Supports + - * / // % and ^ (or **) for powers, the functions sqrt, cbrt, exp, log(x[, base]), ln, log10,
+    log2, sin, cos, tan, asin, acos, atan, atan2, sinh, cosh, tanh, degrees, radians, abs, floor, ceil,
+    round, hypot, factorial, min, max, sum, mean, and the constants pi, e, tau.
+    'variables' maps names to numbers; a name mapped to a list of numbers evaluates the formula for each value.
+    """
+    try:
+        result = evaluate(expression, variables)
+    except ExpressionError as e:
+        return {'ok': False, 'error': str(e)}
+    
+    return {
+        'ok': True,
+        'data': {
+            'expression': expression,
+            'variables': variables or {},
+            'result': result
+        }
+    }
+
+
+
+class StatisticsInput(BaseModel):
+    numbers: Optional[List[Number]] = Field(default=None, description="The dataset, when the user gives the numbers directly.")
+    filename: Optional[str] = Field(default=None, description="Name of a CSV or TXT file uploaded in this chat, instead of 'numbers'.")
+    column: Optional[Union[str, int]] = Field(default=None, description="CSV column name or 0-based index; defaults to the first numeric column.")
+
+    class Config:
+        extra = 'allow'
+
+
+
+def _parse_number(value: str) -> float | None:
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _resolve_column(header: list[str], column: str | int | None) -> int | None:
+    if column is None:
+        return None
+    if isinstance(column, int) or column.strip().isdigit():
+        return int(column)
+    if not header:
+        raise ValueError(f"Column '{column}' not found, the file has no header row.")
+    names = [name.strip().lower() for name in header]
+    if column.strip().lower() not in names:
+        raise ValueError(f"Column '{column}' not found, the file has: {', '.join(header)}")
+    return names.index(column.strip().lower())
+
+
+def _read_csv_chunks(file, column: str | int | None, source: dict) -> Iterator[list[float]]:
+    rows = csv.reader(file)
+    first_row = next(rows, None)
+    if first_row is None:
+        return
+    # a first row with text in it is a header
+    header = first_row if any(cell.strip() and _parse_number(cell) is None for cell in first_row) else []
+    if not header:
+        rows = itertools.chain([first_row], rows)
+
+    index = _resolve_column(header, column)
+    if index is None:
+        # the first column holding a number in the first data row
+        data_row = next(rows, None)
+        if data_row is None:
+            return
+        index = next((i for i, cell in enumerate(data_row) if _parse_number(cell) is not None), None)
+        if index is None:
+            raise ValueError("The file has no numeric column.")
+        rows = itertools.chain([data_row], rows)
+    elif not 0 <= index < len(first_row):
+        raise ValueError(f"Column {index} is out of range, the file has {len(first_row)} columns (0 to {len(first_row) - 1}).")
+    source['column'] = header[index].strip() if index < len(header) else index
+
+    while batch := list(itertools.islice(rows, config.STATS_CHUNK_ROWS)):
+        values = []
+        for row in batch:
+            number = _parse_number(row[index]) if index < len(row) else None
+            if number is None:
+                source['skipped'] += 1
+            else:
+                values.append(number)
+        yield values
+
+
+def _read_txt_chunks(file, source: dict) -> Iterator[list[float]]:
+    values = []
+    for line in file:
+        for token in line.replace(',', ' ').replace(';', ' ').split():
+            number = _parse_number(token)
+            if number is None:
+                source['skipped'] += 1
+            else:
+                values.append(number)
+        if len(values) >= config.STATS_CHUNK_ROWS:
+            yield values
+            values = []
+    if values:
+        yield values
+
+
+def _load_upload(chat_id: str | None, filename: str, column: str | int | None) -> tuple[np.ndarray, dict]:
+    """
+    The values of an uploaded file, parsed STATS_CHUNK_ROWS at a time into a packed float64 buffer:
+    the file costs 8 bytes per value (at most STATS_MAX_VALUES), not a Python float each.
+    """
+    if not is_valid_chat_id(chat_id):
+        raise ValueError("Files can only be read within a chat.")
+    # only the file name counts: the lookup never leaves the chat's upload directory
+    file_path = os.path.join(config.UPLOAD_DIR, chat_id, os.path.basename(filename))
+    if not file_path.endswith(('.csv', '.txt')):
+        raise ValueError("Only CSV and TXT files can be analysed.")
+    if not os.path.isfile(file_path):
+        raise ValueError(f"No uploaded file named '{os.path.basename(filename)}' in this chat.")
+
+    source = {'file': os.path.basename(filename), 'skipped': 0}
+    values = array('d')
+    with open(file_path, newline='', encoding='utf-8', errors='replace') as file:
+        reader = _read_csv_chunks(file, column, source) if file_path.endswith('.csv') else _read_txt_chunks(file, source)
+        for chunk in reader:
+            if len(values) + len(chunk) > config.STATS_MAX_VALUES:
+                raise ValueError(f"The file has more than {config.STATS_MAX_VALUES} values.")
+            values.extend(chunk)
+
+    # a view of the buffer, not a copy
+    return np.frombuffer(values, dtype=float), source
+
+
+def _summarize(values: np.ndarray) -> dict:
+    # one partition call for all quantiles (min and max included), one sort for the mode
+    minimum, p10, p25, median, p75, p90, maximum = np.percentile(values, [0, 10, 25, 50, 75, 90, 100])
+    distinct, counts = np.unique(values, return_counts=True)
+    # the smallest of the most frequent values
+    mode_val = distinct[np.argmax(counts)]
+    total = values.sum()
+    mean = total / values.size
+    deviations = values - mean
+    var = np.dot(deviations, deviations) / values.size
+
+    return {
+        'central_tendency': {
+            'mean': float(round(mean, 3)),
+            'median': float(median),
+            'mode': float(mode_val)
+        },
+        'dispersion': {
+            'std': float(round(np.sqrt(var), 3)),
+            'var': float(round(var, 3)),
+            'range': float(maximum - minimum),
+            'iqr': float(p75 - p25)
+        },
+        'percentiles': {
+            'p10': float(p10),
+            'p25': float(p25),
+            'p75': float(p75),
+            'p90': float(p90)
+        },
+        'aggregations': {
+            'count': int(values.size),
+            'sum': float(total),
+            'min': float(minimum),
+            'max': float(maximum)
+        }
+    }
+
+
+
+@tool('calculate_statistics', args_schema=StatisticsInput)
+def calculate_statistics(numbers: Optional[List[Number]] = None,
+                         filename: Optional[str] = None,
+                         column: Optional[Union[str, int]] = None,
+                         chat_id: Optional[str] = None) -> dict:
     """
     Calculate mean, median, mode, std dev, variance, range, IQR, and percentiles for a dataset.
     Use when a user provides a list of numbers and asks for summary statistics or data spread.
+    For a CSV or TXT file uploaded in this chat, pass its 'filename' (and the CSV 'column') instead of the numbers.
     """
     try:
+        if filename:
+            values, source = _load_upload(chat_id, filename, column)
+            if not values.size:
+                return {'ok': False, 'error': f'No numeric values found in {os.path.basename(filename)}.'}
+            return {'ok': True, 'data': {**_summarize(values), 'source': source}}
+
         if not numbers:
             return {'error': 'List is empty.'}
-        
-        nums = np.array(numbers)
-        n = len(nums)
-        
-        # central Tendency
-        mean = np.mean(nums)
-        median = np.median(nums)
-        # simple mode calculation using Counter
-        data_counts = Counter(numbers)
-        mode_val = data_counts.most_common(1)[0][0]
-
-        # dispersion & range
-        std = np.std(nums)
-        var = np.var(nums)
-        minimum = np.min(nums)
-        maximum = np.max(nums)
-        data_range = maximum - minimum
-        
-        # percentiles
-        p10 = np.percentile(nums, 10)
-        p25 = np.percentile(nums, 25)
-        p75 = np.percentile(nums, 75)
-        p90 = np.percentile(nums, 90)
-        # interquartile Range
-        iqr = p75 - p25
-        
-        processed_data =  {
-            'central_tendency': {
-                'mean': float(round(mean, 3)),
-                'median': float(median),
-                'mode': float(mode_val)
-            },
-            'dispersion': {
-                'std': float(round(std, 3)),
-                'var': float(round(var, 3)),
-                'range': float(data_range),
-                'iqr': float(iqr)
-            },
-            'percentiles': {
-                'p10': float(p10),
-                'p25': float(p25),
-                'p75': float(p75),
-                'p90': float(p90)
-            },
-            'aggregations': {
-                'count': int(n),
-                'sum': float(np.sum(nums)),
-                'min': float(minimum),
-                'max': float(maximum)
-            }
-        }
-        return {'ok': True, 'data': processed_data}
+        return {'ok': True, 'data': _summarize(np.asarray(numbers, dtype=float))}
     
     except Exception as e:
         return {'ok': False, 'error': str(e)}
-
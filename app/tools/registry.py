@@ -1,7 +1,9 @@
 from app.tools.weather_tools import get_weather_data
 from app.tools.time_tools import get_current_time, calculate_date_relative, convert_time_zones
-from app.tools.math_tools import scientific_calculator, calculate_statistics
+from app.tools.time_tools import get_current_time_batch, calculate_date_relative_batch, convert_time_zones_batch
+from app.tools.math_tools import scientific_calculator, evaluate_expression, calculate_statistics
 from app.tools.knowledge_base import query_knowledge_base
+from app.tools.cache import CachedTool
 
 
 
@@ -10,8 +12,15 @@ TOOL_REGISTRY = {
     "get_current_time": get_current_time,
     "calculate_date_relative": calculate_date_relative,
     "convert_time_zones": convert_time_zones,
+    "get_current_time_batch": get_current_time_batch,
+    "calculate_date_relative_batch": calculate_date_relative_batch,
+    "convert_time_zones_batch": convert_time_zones_batch,
     "scientific_calculator": scientific_calculator,
+    "evaluate_expression": evaluate_expression,
     "calculate_statistics": calculate_statistics,
     'query_knowledge_base': query_knowledge_base,
 
-}
\ No newline at end of file
+}
+
+# serving repeated invocations from the result cache (TTL policies live in config)
+TOOL_REGISTRY = {name: CachedTool(tool) for name, tool in TOOL_REGISTRY.items()}
\ No newline at end of file
@@ -1,8 +1,82 @@
+from pydantic import BaseModel, Field
 from langchain.tools import tool
+from app.core import config
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from dateutil.relativedelta import relativedelta 
-from typing import Literal
+from functools import lru_cache
+from typing import Literal, List
+
+
+
+Unit = Literal['days', 'weeks', 'months', 'years']
+Direction = Literal['future', 'past']
+
+
+class DateOffset(BaseModel):
+    value: int = Field(description="How many units to move.")
+    unit: Unit = 'days'
+    direction: Direction = 'future'
+
+
+
+@lru_cache(maxsize=config.TIMEZONE_CACHE_SIZE)
+def get_zone(timezone: str) -> ZoneInfo:
+    """
+    The resolved ZoneInfo of an IANA name, kept for the process: batch calls and repeated
+    calls for the same cities skip the key validation and tzdata lookup.
+    Invalid names raise and are not cached.
+    """
+    return ZoneInfo(timezone.strip())
+
+
+def _too_many(name: str, count: int) -> dict | None:
+    if count > config.TIME_TOOLS_MAX_ITEMS:
+        return {'ok': False, 'error': f"At most {config.TIME_TOOLS_MAX_ITEMS} {name} per call."}
+    return None
+
+
+def _current_time(timezone: str, now: datetime) -> dict:
+    local = now.astimezone(get_zone(timezone))
+    return {
+        'iso': local.isoformat(),
+        'readable': local.strftime('%A, %B %d, %Y %I:%M %p'),
+        'timezone': timezone,
+        'is_dst': bool(local.dst())
+    }
+
+
+def _relative_date(start: datetime, value: int, unit: Unit, direction: Direction) -> dict:
+    # adjusting value based on direction
+    amount = abs(value) if direction == 'future' else -abs(value)
+    
+    # calculation
+    if unit not in ('days', 'weeks', 'months', 'years'):
+        raise ValueError(f'Invalid unit: {unit}')
+    result = start + relativedelta(**{unit: amount})
+    
+    return {
+        'base_date': start.strftime('%Y-%m-%d'),
+        'target_date': result.strftime('%Y-%m-%d'),
+        'day_of_week': result.strftime('%A'),
+        'direction': direction,
+        'description': f'{value} {unit} in the {direction}'
+    }
+
+
+def _convert(timestamp: str, from_tz: str, to_tz: str) -> dict:
+    # parsing the ISO string and attach the source timezone info
+    dt = datetime.fromisoformat(timestamp).replace(tzinfo=get_zone(from_tz))
+    
+    # converting to the target timezone
+    converted = dt.astimezone(get_zone(to_tz))
+    
+    return {
+        'source': f'{timestamp} ({from_tz})',
+        'converted': converted.strftime('%Y-%m-%d %H:%M'),
+        'converted_iso': converted.isoformat(),
+        'target_timezone': to_tz
+    }
 
 
 
@@ -13,24 +87,37 @@ def get_current_time(timezone: str = 'Asia/Kolkata') -> dict:
     Defaults to 'Asia/Kolkata'. Use for 'What time is it?' or current date queries.
     """
     try:
-        now = datetime.now(ZoneInfo(timezone))
-        processed_data =  {
-            'iso': now.isoformat(),
-            'readable': now.strftime('%A, %B %d, %Y %I:%M %p'),
-            'timezone': timezone,
-            'is_dst': bool(now.dst())
-        }
-        return {'ok': True, 'data': processed_data}
+        return {'ok': True, 'data': _current_time(timezone, datetime.now(get_zone('UTC')))}
     except Exception as e:
         return {'ok': False, 'error': f'Invalid timezone: {str(e)}'}
 
 
 
+@tool('get_current_time_batch')
+def get_current_time_batch(timezones: List[str]) -> dict:
+    """
+    Get the current date and time in several IANA timezones at once, e.g. ['Europe/London', 'Asia/Tokyo'].
+    Use instead of repeated get_current_time calls when the user asks about more than one place.
+    """
+    if error := _too_many('timezones', len(timezones)):
+        return error
+    # one instant for every zone, so the results are consistent with each other
+    now = datetime.now(get_zone('UTC'))
+    results = []
+    for timezone in timezones:
+        try:
+            results.append({'ok': True, **_current_time(timezone, now)})
+        except Exception as e:
+            results.append({'ok': False, 'timezone': timezone, 'error': f'Invalid timezone: {str(e)}'})
+    return {'ok': True, 'data': {'results': results}}
+
+
+
 @tool('calculate_date_relative')
 def calculate_date_relative(base_date: str | None = None, 
                             value: int = 0, 
-                            unit: Literal['days', 'weeks', 'months', 'years'] = 'days',
-                            direction: Literal['future', 'past'] = 'future') -> dict:
+                            unit: Unit = 'days',
+                            direction: Direction = 'future') -> dict:
     """
     Calculate a past or future date relative to 'base_date' (ISO YYYY-MM-DD).
     'base_date' defaults to today. Use for '10 days from now' or '3 weeks ago'.
@@ -38,33 +125,35 @@ def calculate_date_relative(base_date: str | None = None,
     try:
         # start date
         start = datetime.fromisoformat(base_date) if base_date else datetime.now()
-        
-        # adjusting value based on direction
-        amount = abs(value) if direction == 'future' else -abs(value)
-        
-        # calculation
-        if unit == 'days':
-            result = start + relativedelta(days=amount)
-        elif unit == 'weeks':
-            result = start + relativedelta(weeks=amount)
-        elif unit == 'months':
-            result = start + relativedelta(months=amount)
-        elif unit == 'years':
-            result = start + relativedelta(years=amount)
-        else:
-            return {'ok': False, 'error': f'Invalid unit: {unit}'}
-        
-        processed_data =  {
-            'base_date': start.strftime('%Y-%m-%d'),
-            'target_date': result.strftime('%Y-%m-%d'),
-            'day_of_week': result.strftime('%A'),
-            'direction': direction,
-            'description': f'{value} {unit} in the {direction}'
-        }
-        return {'ok': True, 'data': processed_data}
+        return {'ok': True, 'data': _relative_date(start, value, unit, direction)}
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+
+
+
+@tool('calculate_date_relative_batch')
+def calculate_date_relative_batch(offsets: List[DateOffset], base_date: str | None = None) -> dict:
+    """
+    Calculate several past or future dates relative to one 'base_date' (ISO YYYY-MM-DD, defaults to today),
+    e.g. offsets [{'value': 30, 'unit': 'days'}, {'value': 2, 'unit': 'months', 'direction': 'past'}].
+    Use instead of repeated calculate_date_relative calls.
+    """
+    if error := _too_many('offsets', len(offsets)):
+        return error
+    try:
+        start = datetime.fromisoformat(base_date) if base_date else datetime.now()
     except Exception as e:
         return {'ok': False, 'error': str(e)}
 
+    results = []
+    for offset in offsets:
+        offset = DateOffset.model_validate(offset)
+        try:
+            results.append({'ok': True, **_relative_date(start, offset.value, offset.unit, offset.direction)})
+        except Exception as e:
+            results.append({'ok': False, 'offset': offset.model_dump(), 'error': str(e)})
+    return {'ok': True, 'data': {'results': results}}
+
 
 
 @tool('convert_time_zones')
@@ -74,19 +163,26 @@ def convert_time_zones(timestamp: str, from_tz: str, to_tz: str) -> dict:
     Use for queries like 'What time is 3 PM in New York in London?'.
     """
     try:
-        # parsing the ISO string and attach the source timezone info
-        dt = datetime.fromisoformat(timestamp).replace(tzinfo=ZoneInfo(from_tz))
-        
-        # converting to the target timezone
-        converted = dt.astimezone(ZoneInfo(to_tz))
-        
-        processed_data = {
-            'source': f'{timestamp} ({from_tz})',
-            'converted': converted.strftime('%Y-%m-%d %H:%M'),
-            'converted_iso': converted.isoformat(),
-            'target_timezone': to_tz
-        }
-        return {'ok': True, 'data': processed_data}
-    
+        return {'ok': True, 'data': _convert(timestamp, from_tz, to_tz)}
     except Exception as e:
-        return {'ok': False, 'error': str(e)}
\ No newline at end of file
+        return {'ok': False, 'error': str(e)}
+
+
+
+@tool('convert_time_zones_batch')
+def convert_time_zones_batch(timestamps: List[str], from_tz: str, to_tzs: List[str]) -> dict:
+    """
+    Convert one or more ISO timestamps from a source timezone into several target timezones in one call,
+    e.g. a meeting time shown in six cities. Every timestamp is converted into every target timezone.
+    Use instead of repeated convert_time_zones calls.
+    """
+    if error := _too_many('conversions', len(timestamps) * len(to_tzs)):
+        return error
+    results = []
+    for timestamp in timestamps:
+        for to_tz in to_tzs:
+            try:
+                results.append({'ok': True, **_convert(timestamp, from_tz, to_tz)})
+            except Exception as e:
+                results.append({'ok': False, 'source': f'{timestamp} ({from_tz})', 'target_timezone': to_tz, 'error': str(e)})
+    return {'ok': True, 'data': {'results': results}}
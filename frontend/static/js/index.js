@@ -210,10 +210,10 @@ function createNewChat() {
 async function LoadChatLists() {
     const res = await fetch("http://localhost:8000/all-chats");
     const data = await res.json();
-    await RenderChatLists(data.chats);
+    await RenderChatLists(data.chats, data.next_cursor);
 }
 
-async function RenderChatLists(all_chats){
+async function RenderChatLists(all_chats, next_cursor=null){
     chatUl.innerHTML = '';
     if (!all_chats || all_chats.length === 0){
         console.log('no chats found');
@@ -227,26 +227,48 @@ async function RenderChatLists(all_chats){
     noChatsBanner.style.display = 'none';
     chatUl.style.display = 'block';
     
-    all_chats.forEach(chat => {
-        const item = document.createElement('li')
-        item.textContent = chat.title;
-        item.classList.add('chat-item');
-        item.setAttribute('id', chat.id);
-        item.setAttribute('title', chat.title);
-        chatUl.appendChild(item);
-        item.addEventListener('click', (e) => {
-            ClearActiveChats();
-            e.currentTarget.classList.add('active');
-            // loading this clicked chat
-            LoadCurrentChats(chat.id);
-        });
-    });
+    all_chats.forEach(chat => chatUl.appendChild(CreateChatItem(chat)));
+    AppendLoadMoreChats(next_cursor);
     
     // highliting current chat
     HighlightActiveChat();
 }
 
 
+function CreateChatItem(chat){
+    const item = document.createElement('li')
+    item.textContent = chat.title;
+    item.classList.add('chat-item');
+    item.setAttribute('id', chat.id);
+    item.setAttribute('title', chat.title);
+    item.addEventListener('click', (e) => {
+        ClearActiveChats();
+        e.currentTarget.classList.add('active');
+        // loading this clicked chat
+        LoadCurrentChats(chat.id);
+    });
+    return item;
+}
+
+
+// the chat list comes in pages, the next one is fetched on demand
+function AppendLoadMoreChats(next_cursor){
+    if (!next_cursor) return;
+    const more = document.createElement('li');
+    more.textContent = 'Load more chats';
+    more.classList.add('chat-item', 'load-more');
+    more.addEventListener('click', async () => {
+        const res = await fetch(`http://localhost:8000/all-chats?cursor=${encodeURIComponent(next_cursor)}`);
+        const data = await res.json();
+        more.remove();
+        data.chats.forEach(chat => chatUl.appendChild(CreateChatItem(chat)));
+        AppendLoadMoreChats(data.next_cursor);
+        HighlightActiveChat();
+    });
+    chatUl.appendChild(more);
+}
+
+
 function ClearActiveChats(){
     const activeChats = document.querySelectorAll('.chat-item');
     activeChats.forEach(chat => {
@@ -320,26 +342,60 @@ function RenderCurrentChatMessages(chat_data){
 
     // rendering the current chat messages inside the container
     chat_data.messages.forEach(msg => {
-        if (msg.role === 'tool') return;
-        if (msg.role === 'assistant'){
-            if (msg.content === 'Searching my tools...' || msg.tool_calls){
-                console.log('here');
-                return;
-            }
-        }
-        if (!msg.content) return;
-
-        // now, constructing the message bubble
-        const div = document.createElement('div');
-        div.className = msg.role === 'user' ? 'message-bubble user-msg' : 'message-bubble assistant-msg';
-        div.innerHTML = marked.parse(msg.content, {breaks: true, gfm: true});
-        messagesContainer.appendChild(div);
+        const div = CreateMessageBubble(msg);
+        if (div) messagesContainer.appendChild(div);
     });
+    PrependLoadEarlierMessages(chat_data.id, chat_data.next_cursor);
     ScrollToBottom();
 
 }
 
 
+function CreateMessageBubble(msg){
+    if (msg.role === 'tool') return null;
+    if (msg.role === 'assistant'){
+        if (msg.content === 'Searching my tools...' || msg.tool_calls){
+            return null;
+        }
+    }
+    if (!msg.content) return null;
+
+    // now, constructing the message bubble
+    const div = document.createElement('div');
+    div.className = msg.role === 'user' ? 'message-bubble user-msg' : 'message-bubble assistant-msg';
+    div.innerHTML = marked.parse(msg.content, {breaks: true, gfm: true});
+    return div;
+}
+
+
+// only the latest messages are loaded with the chat, older pages on demand
+function PrependLoadEarlierMessages(chat_id, next_cursor){
+    if (!next_cursor) return;
+    const more = document.createElement('button');
+    more.textContent = 'Load earlier messages';
+    more.className = 'load-earlier';
+    more.addEventListener('click', async () => {
+        const res = await fetch(`http://localhost:8000/chat/${chat_id}?cursor=${encodeURIComponent(next_cursor)}`);
+        const data = await res.json();
+        // the chat may have been switched while loading
+        if (CURRENT_CHAT_ID !== chat_id) return;
+
+        // keeping the visible messages in place while older ones are added above
+        const previousHeight = messagesContainer.scrollHeight;
+        more.remove();
+        const older = document.createDocumentFragment();
+        data.messages.forEach(msg => {
+            const div = CreateMessageBubble(msg);
+            if (div) older.appendChild(div);
+        });
+        messagesContainer.prepend(older);
+        PrependLoadEarlierMessages(chat_id, data.next_cursor);
+        messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+    });
+    messagesContainer.prepend(more);
+}
+
+
 
 
 function RenderUserMessage(text){
@@ -0,0 +1,71 @@
+from app.tools.expression_engine import evaluate, ExpressionError
+from app.tools.math_tools import evaluate_expression
+import json
+import pytest
+
+
+
+def test_formulas():
+    assert evaluate("2 + 3 * 4") == 14
+    assert evaluate("2 ^ 3 ^ 2") == 512
+    assert evaluate("-2 ^ 2") == -4
+    assert evaluate("sqrt(a^2 + b^2)", {"a": 3, "b": 4}) == 5.0
+    assert evaluate("x * 2", {"x": [1, 2, 3]}) == [2.0, 4.0, 6.0]
+    assert evaluate("max(x)", {"x": [1, 5, 3]}) == 5.0
+    assert evaluate("factorial(30)") == 265252859812191058636308480000000
+    assert evaluate("2 ^ 5000") == 2 ** 5000
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('ls')",
+    "(1).__class__",
+    "open('/etc/passwd')",
+    "[1, 2]",
+    "'text'",
+    "lambda: 1",
+    "x if 1 else 2",
+    "sqrt(x=4)",
+])
+def test_rejects_unsupported_syntax(expression):
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+
+
+@pytest.mark.parametrize("expression", ["(-8) ^ (1/3)", "(-2) ** 0.5", "-1 ** 0.5 + (-1) ** 0.5"])
+def test_rejects_complex_results(expression):
+    with pytest.raises(ExpressionError, match="not a real number"):
+        evaluate(expression)
+
+
+@pytest.mark.parametrize("expression", ["9 ^ 9 ^ 9", "factorial(1000) * factorial(1000)", "factorial(1001)", "2 ^ 10000 * 2 ^ 10000"])
+def test_bounds_integer_results(expression):
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+
+
+@pytest.mark.parametrize("expression, variables", [
+    ("1e308 * 10", None),
+    ("10 ** 400.0", None),
+    ("exp(1000) - exp(1000)", None),
+    ("log(x)", {"x": [1, 0]}),
+])
+def test_rejects_non_finite_results(expression, variables):
+    with pytest.raises(ExpressionError):
+        evaluate(expression, variables)
+
+
+def test_bounds_array_cost():
+    with pytest.raises(ExpressionError, match="too expensive"):
+        evaluate(" + ".join(["x"] * 30), {"x": [1] * 100_000})
+
+
+def test_errors_are_expression_errors():
+    for expression in ("1 / 0", "log(0)", "sqrt(-1)", "unknown(1)", "y + 1", "1 +"):
+        with pytest.raises(ExpressionError):
+            evaluate(expression)
+
+
+@pytest.mark.parametrize("expression", ["(-8) ^ (1/3)", "factorial(1000) * factorial(1000)", "1e308 * 10", "2 ^ 0.5"])
+def test_tool_results_serialize(expression):
+    # tool results are sent back to the model as JSON
+    json.dumps(evaluate_expression.invoke({"expression": expression}))
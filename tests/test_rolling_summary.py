@@ -0,0 +1,60 @@
+from langchain.messages import HumanMessage, AIMessage
+from app.core.chat_service import ChatService
+from app.core.memory import ChatMemory
+from app.agents import agents
+from app.core import config
+import asyncio
+import random
+import pytest
+
+
+
+def turn(index: int, rng: random.Random) -> list:
+    filler = "x" * rng.randint(10, 1500)
+    return [HumanMessage(content=f"q{index} {filler}"), AIMessage(content=f"a{index} {filler}")]
+
+
+@pytest.mark.parametrize("summarizer_lag", [0, 1, 2])
+def test_no_turn_leaves_both_window_and_summary(monkeypatch, summarizer_lag):
+    """Every turn is in the prompt window or in the rolling summary, also while summaries take a few turns."""
+    calls = []
+
+    async def summarize(previous_summary, messages):
+        # a summary finishes `summarizer_lag` turns after it started and lists the turns folded into it
+        done = asyncio.Event()
+        calls.append((current_turn, done))
+        await done.wait()
+        return " ".join(filter(None, [previous_summary] + [message.content.split()[0] for message in messages]))
+
+    monkeypatch.setattr(agents, "summarize_conversation", summarize)
+
+    async def run():
+        nonlocal current_turn
+        service = ChatService.__new__(ChatService)
+        memory = ChatMemory()
+        rng = random.Random(7)
+        for index in range(80):
+            current_turn = index
+            for message in turn(index, rng):
+                memory.add_message(message)
+            # the first pass and a tool follow-up routed to the model with the smaller budget
+            for model_name in (config.NEW_OPENAI_MODEL, config.DEFAULT_MODEL):
+                window = service._build_context(memory, model_name, "general_assistant", None)
+
+                in_window = {message.content.split()[0] for message in window}
+                in_summary = set((memory.summary or "").split())
+                for seen in range(index + 1):
+                    assert {f"q{seen}", f"a{seen}"} <= in_window | in_summary
+
+            # starting the new summary, finishing the ones started `summarizer_lag` turns ago
+            await asyncio.sleep(0)
+            for started, done in calls:
+                if index - started >= summarizer_lag:
+                    done.set()
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+    current_turn = 0
+    asyncio.run(run())
+    # folded in batches, not on every turn
+    assert 0 < len(calls) < 40
@@ -0,0 +1,21 @@
+from datetime import datetime
+import base64
+import json
+
+
+
+def encode_cursor(timestamp: datetime, key: str | int) -> str:
+    """Opaque, URL-safe keyset cursor of a (timestamp, id) pair."""
+    raw = json.dumps([timestamp.isoformat(), key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str | int]:
+    """Inverse of `encode_cursor`; raises ValueError on a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(timestamp), key
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e